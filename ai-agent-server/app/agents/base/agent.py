@@ -6,7 +6,10 @@ Provides common functionality for tool execution, token tracking,
 streaming, retries, and output formatting.
 """
 
+import asyncio
+import hashlib
 import logging
+import re
 from abc import ABC, abstractmethod
 from typing import Optional, Any, Callable, Awaitable
 from datetime import datetime, timezone
@@ -20,12 +23,13 @@ from app.agents.base.context import AgentState, ExecutionContext
 from app.agents.base.output import AgentOutput
 from app.llms import (
     TokenTrackingCallback, StreamingTokenCounter,
-    create_model, create_streaming_model,
+    get_cached_model, get_cached_model_for_task,
 )
-from app.tokens import TokenLimiter, TokenUsage, QuotaExceededError
-from app.observability import AgentLogger, AgentLog, ToolCall
-from app.memory import RedisMemoryStore
+from app.tokens import TokenUsage, QuotaExceededError
+from app.observability import AgentLog, ToolCall
 from app.config import get_settings
+from app.memory.redis_memory import get_redis_client
+from app.serialization import json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -33,6 +37,25 @@ settings = get_settings()
 # Type alias for the streaming callback
 StreamCallback = Callable[[str], Awaitable[None]]
 
+# TTL for cached tool-selection results (near-duplicate questions skip the LLM)
+TOOL_SELECTION_CACHE_TTL = 3600
+
+# First JSON array in a selection response — tolerates code fences and prose
+_JSON_ARRAY_RE = re.compile(r"\[[^\[\]]*\]", re.S)
+
+# Stream deltas are coalesced before hitting the callback: flush once the
+# buffer reaches this many characters or this much time has passed. Small
+# enough that typing still looks live, large enough to amortize the
+# per-callback overhead under concurrency.
+_STREAM_FLUSH_CHARS = 32
+_STREAM_FLUSH_SECONDS = 0.05
+
+# List fields in tool results are capped to this many items before being
+# serialized into an LLM prompt — prefill cost scales with input tokens,
+# and the analysis only ever surfaces a handful of rows
+_PROMPT_LIST_LIMIT = 50
+_PROMPT_LIST_FIELDS = ("products", "orders", "warehouses", "customers", "statuses", "alerts")
+
 
 class BaseAgent(ABC):
     """
@@ -51,7 +74,25 @@ class BaseAgent(ABC):
     name: str = "base_agent"
     description: str = "Base agent"
     system_prompt: str = ""
-    
+
+    # Fallback tool names used when LLM tool selection fails
+    default_tools: list[str] = []
+
+    # Rule tier for tool selection: (compiled pattern, tool names) pairs
+    # checked against the normalized question before any LLM call
+    keyword_routes: tuple = ()
+
+    # Escape hatch for the rule tier: inputs matching this pattern always go
+    # to the LLM selector (e.g. action requests that must reach the
+    # confirmation workflow instead of a read-only route)
+    keyword_route_guard: Optional[re.Pattern] = None
+
+    # Filled tool-selection system prompts keyed by tool set — the catalog
+    # only changes with the registry, so materialize (catalog hash, prompt)
+    # once and reuse the byte-identical string on every request. A stable
+    # prompt also keeps the provider-side prompt-cache prefix stable.
+    _tool_desc_cache: dict[frozenset, tuple[str, str]] = {}
+
     # Default model config
     default_provider: str = "groq"
     default_model: str = "llama-3.3-70b-versatile"
@@ -87,20 +128,16 @@ class BaseAgent(ABC):
         context = state["context"]
         start_time = time.time()
         
-        # Initialize components
-        limiter = TokenLimiter(context.auth.org_id)
-        agent_logger = AgentLogger(
-            org_id=context.auth.org_id,
-            user_id=context.auth.user_id,
-            session_id=context.session_id
-        )
+        # Initialize components (cached on context, shared across LLM calls)
+        limiter = context.get_limiter()
+        agent_logger = context.get_agent_logger()
         
         # Pre-check quota
         try:
             await limiter.check_quota(context.token_budget)
         except QuotaExceededError as e:
             state["error"] = str(e)
-            state["output"] = AgentOutput.error_response(str(e)).model_dump()
+            state["output"] = AgentOutput.error_response(str(e)).dump()
             return state
         
         # Execute agent
@@ -124,7 +161,7 @@ class BaseAgent(ABC):
             state["error"] = str(e)
             state["output"] = AgentOutput.error_response(
                 f"An error occurred: {str(e)}"
-            ).model_dump()
+            ).dump()
             log.error = str(e)
         
         # Finalize timing
@@ -135,9 +172,9 @@ class BaseAgent(ABC):
             ToolCall(**t) for t in state.get("tools_called", [])
         ]
         
-        # Store log
-        await agent_logger.log_execution(log)
-        
+        # Store log off the response path
+        context.add_background_task(agent_logger.log_execution(log))
+
         return state
     
     async def invoke_llm(
@@ -155,7 +192,17 @@ class BaseAgent(ABC):
             Tuple of (response, token_usage)
         """
         context = state["context"]
-        
+
+        # Build the model binding once — retries below only re-issue the call
+        callback = TokenTrackingCallback()
+        model = get_cached_model(
+            provider=self.provider,
+            model=self.model_name,
+        )
+        if structured_output:
+            model = model.with_structured_output(structured_output)
+        model = model.with_config(callbacks=[callback])
+
         @retry(
             stop=stop_after_attempt(settings.llm_max_retries),
             wait=wait_exponential(
@@ -167,26 +214,16 @@ class BaseAgent(ABC):
             reraise=True,
         )
         async def _invoke():
-            callback = TokenTrackingCallback()
-            model = create_model(
-                provider=self.provider,
-                model=self.model_name,
-                callbacks=[callback]
-            )
-            
-            if structured_output:
-                model = model.with_structured_output(structured_output)
-            
             response = await model.ainvoke(messages)
             usage = callback.get_usage(self.provider)
             return response, usage
-        
+
         response, usage = await _invoke()
-        
-        # Record usage
-        limiter = TokenLimiter(context.auth.org_id)
-        await limiter.record_usage(usage, context.auth.user_id)
-        
+
+        # Record usage off the response path
+        limiter = context.get_limiter()
+        context.add_background_task(limiter.record_usage(usage, context.auth.user_id))
+
         # Update context
         context.tokens_used += usage.input_tokens + usage.output_tokens
         
@@ -201,13 +238,13 @@ class BaseAgent(ABC):
         """
         Stream LLM response token-by-token.
         
-        Calls stream_callback(delta) for each token chunk, then returns
-        the full accumulated response and usage stats.
-        
+        Calls stream_callback(delta) with coalesced token batches, then
+        returns the full accumulated response and usage stats.
+
         Args:
             state: Current agent state
             messages: LLM messages
-            stream_callback: Async callback called with each token chunk
+            stream_callback: Async callback called with each delta batch
             
         Returns:
             Tuple of (full_response_text, token_usage)
@@ -215,32 +252,133 @@ class BaseAgent(ABC):
         context = state["context"]
         counter = StreamingTokenCounter()
         
-        model = create_streaming_model(
+        model = get_cached_model(
             provider=self.provider,
             model=self.model_name,
-            callbacks=[counter]
-        )
+            streaming=True,
+        ).with_config(callbacks=[counter])
         
         full_response = []
+        get_content = None
+        buffer = []
+        buffered_len = 0
+        last_flush = time.monotonic()
         async for chunk in model.astream(messages):
-            token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if get_content is None:
+                # Bind the extraction strategy on the first chunk — hasattr()
+                # per token is needless overhead in the hottest loop here
+                get_content = (lambda c: c.content) if hasattr(chunk, 'content') else str
+            token = get_content(chunk)
             if token:
                 full_response.append(token)
                 if stream_callback:
-                    await stream_callback(token)
-        
+                    buffer.append(token)
+                    buffered_len += len(token)
+                    now = time.monotonic()
+                    if (buffered_len >= _STREAM_FLUSH_CHARS
+                            or now - last_flush >= _STREAM_FLUSH_SECONDS):
+                        await stream_callback("".join(buffer))
+                        buffer.clear()
+                        buffered_len = 0
+                        last_flush = now
+        if buffer:
+            await stream_callback("".join(buffer))
+
         response_text = "".join(full_response)
         usage = counter.get_usage(self.provider)
         
-        # Record usage
-        limiter = TokenLimiter(context.auth.org_id)
-        await limiter.record_usage(usage, context.auth.user_id)
+        # Record usage off the response path
+        limiter = context.get_limiter()
+        context.add_background_task(limiter.record_usage(usage, context.auth.user_id))
         context.tokens_used += usage.input_tokens + usage.output_tokens
         
         return response_text, usage
     
     # ─── Shared Methods (eliminate duplication across domain agents) ──────
-    
+
+    async def _select_tools(self, state: AgentState, tools: list, user_input: str) -> list[str]:
+        """
+        Use LLM to intelligently select which tools to run.
+
+        Shared across all domain agents. Unambiguous phrasings are routed by
+        the agent's keyword_routes rule tier with no network round-trip at
+        all; everything else hits a Redis cache keyed by (tool set,
+        normalized question) before falling back to the LLM.
+        """
+        from app.agents.prompts import TOOL_SELECTION_SYSTEM_PROMPT
+
+        normalized = user_input.lower().strip()
+
+        # Rule tier — cheapest first: a keyword hit skips both cache and LLM.
+        # Guarded phrasings bypass the tier entirely and fall through to the
+        # LLM selector.
+        guard = self.keyword_route_guard
+        if guard is None or not guard.search(normalized):
+            for pattern, tool_names in self.keyword_routes:
+                if pattern.search(normalized):
+                    logger.info(f"Keyword route hit: {list(tool_names)}")
+                    return list(tool_names)
+
+        cache_key = frozenset((tool.name, tool.description) for tool in tools)
+        cached_prompt = self._tool_desc_cache.get(cache_key)
+        if cached_prompt is None:
+            # Sorted by name so the prompt prefix is byte-stable across processes
+            tool_descriptions = "\n".join([
+                f"- {tool.name}: {tool.description}"
+                for tool in sorted(tools, key=lambda t: t.name)
+            ])
+            cached_prompt = (
+                hashlib.sha1(tool_descriptions.encode()).hexdigest()[:12],
+                TOOL_SELECTION_SYSTEM_PROMPT.format(
+                    tool_descriptions=tool_descriptions
+                ),
+            )
+            self._tool_desc_cache[cache_key] = cached_prompt
+        catalog_hash, system_prompt = cached_prompt
+
+        selection_key = (
+            f"toolsel:{catalog_hash}"
+            f":{hashlib.sha1(normalized.encode()).hexdigest()}"
+        )
+        try:
+            redis_client = await get_redis_client()
+            cached = await redis_client.get(selection_key)
+            if cached:
+                selected = json_loads(cached)
+                if isinstance(selected, list) and len(selected) > 0:
+                    logger.info(f"Tool selection cache hit: {selected}")
+                    return selected[:4]
+        except Exception as e:
+            logger.debug(f"Tool selection cache read failed: {e}")
+
+        try:
+            model, _ = get_cached_model_for_task("tool_selection")
+
+            response = await model.ainvoke([
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=f"User question: {user_input}")
+            ])
+
+            text = response.content if hasattr(response, 'content') else str(response)
+            # Extract the first JSON array, wherever it sits in the response
+            match = _JSON_ARRAY_RE.search(text)
+            selected = json_loads(match.group(0)) if match else None
+            if isinstance(selected, list) and len(selected) > 0:
+                logger.info(f"LLM selected tools: {selected}")
+                try:
+                    redis_client = await get_redis_client()
+                    await redis_client.setex(
+                        selection_key, TOOL_SELECTION_CACHE_TTL, json_dumps(selected[:4])
+                    )
+                except Exception as e:
+                    logger.debug(f"Tool selection cache write failed: {e}")
+                return selected[:4]  # Max 4 tools
+        except Exception as e:
+            logger.warning(f"LLM tool selection failed, using defaults: {e}")
+
+        # Fallback: per-agent defaults if LLM selection fails
+        return list(self.default_tools)
+
     async def execute_tools(
         self,
         state: AgentState,
@@ -250,74 +388,113 @@ class BaseAgent(ABC):
     ) -> dict:
         """
         Execute a list of tools by name and return results.
-        
+
         Shared across all domain agents to avoid code duplication.
-        
+        Tools are I/O-bound (DB/API calls), so they run concurrently via
+        asyncio.gather — wall-time is the slowest tool, not the sum of all.
+
         Args:
             state: Current agent state
             tools: List of tool instances
             tools_to_run: Names of tools to execute
             **extra_kwargs: Per-tool keyword args as {tool_name: {kwarg: value}}
-            
+
         Returns:
             Dict mapping tool_name -> result data
         """
         results = {}
         tools_called = state.get("tools_called", [])
-        
-        for tool in tools:
-            if tool.name in tools_to_run:
-                try:
-                    kwargs = extra_kwargs.get(tool.name, {})
-                    start = time.time()
-                    result = await tool.run(**kwargs)
-                    duration_ms = int((time.time() - start) * 1000)
-                    
-                    if result.success:
-                        results[tool.name] = result.data
-                    
-                    tools_called.append({
-                        "name": tool.name,
-                        "input": kwargs,
-                        "output": result.data if result.success else None,
-                        "duration_ms": duration_ms,
-                        "error": result.error if not result.success else None,
-                    })
-                except Exception as e:
-                    logger.error(f"Tool {tool.name} failed: {e}")
-                    tools_called.append({
-                        "name": tool.name,
-                        "input": {},
-                        "output": None,
-                        "duration_ms": 0,
-                        "error": str(e),
-                    })
-        
+
+        selected = [
+            (tool, extra_kwargs.get(tool.name, {}))
+            for tool in tools if tool.name in tools_to_run
+        ]
+
+        async def _run_one(tool, kwargs: dict) -> dict:
+            """Run a single tool, catching errors so one failure doesn't sink the batch."""
+            try:
+                start = time.time()
+                result = await tool.run(**kwargs)
+                duration_ms = int((time.time() - start) * 1000)
+                return {
+                    "name": tool.name,
+                    "input": kwargs,
+                    "output": result.data if result.success else None,
+                    "duration_ms": duration_ms,
+                    "error": result.error if not result.success else None,
+                }
+            except Exception as e:
+                logger.error(f"Tool {tool.name} failed: {e}")
+                return {
+                    "name": tool.name,
+                    "input": {},
+                    "output": None,
+                    "duration_ms": 0,
+                    "error": str(e),
+                }
+
+        # gather preserves input order, so results/tools_called stay deterministic
+        outcomes = await asyncio.gather(*[_run_one(t, kw) for t, kw in selected])
+
+        for outcome in outcomes:
+            if outcome["error"] is None:
+                results[outcome["name"]] = outcome["output"]
+            tools_called.append(outcome)
+
         state["tools_called"] = tools_called
         return results
     
+    @staticmethod
+    def truncate_for_llm(tool_results: dict, per_list: int = _PROMPT_LIST_LIMIT) -> dict:
+        """
+        Cap list fields in tool results before serializing them into a prompt.
+
+        Returns a shallow copy, so the original results keep their full
+        lists for charts and tables. Truncated entries gain truncated_to
+        and total_<field> markers so the model knows it is seeing a sample.
+        """
+        truncated = {}
+        for name, data in tool_results.items():
+            if isinstance(data, dict):
+                copied = None
+                for field_name in _PROMPT_LIST_FIELDS:
+                    lst = data.get(field_name)
+                    if isinstance(lst, list) and len(lst) > per_list:
+                        if copied is None:
+                            copied = dict(data)
+                        copied[field_name] = lst[:per_list]
+                        copied["truncated_to"] = per_list
+                        copied[f"total_{field_name}"] = len(lst)
+                if copied is not None:
+                    data = copied
+            truncated[name] = data
+        return truncated
+
     def is_empty_data(self, tool_results: dict) -> bool:
         """
         Check if all tool results contain empty or zero data.
-        
+
         Shared across all domain agents to avoid code duplication.
+        Returns False on the first meaningful value found, so expected
+        cost is O(first non-empty item), not O(total items).
         """
         if not tool_results:
             return True
-        
-        for key, data in tool_results.items():
+
+        for data in tool_results.values():
             if not data:
                 continue
+            if isinstance(data, list):
+                # Non-empty list is meaningful content
+                return False
             if isinstance(data, dict):
                 # Check for meaningful content
-                for k, v in data.items():
-                    if isinstance(v, (list, dict)) and len(v) > 0:
+                for v in data.values():
+                    if isinstance(v, (list, dict)) and v:
                         return False
                     if isinstance(v, (int, float)) and v > 0:
                         return False
-            elif isinstance(data, list) and len(data) > 0:
-                return False
-        
+
         return True
     
     def create_empty_data_response(self) -> AgentOutput:
@@ -4,7 +4,8 @@ Agent Execution Context
 Carries all execution state through agent graph.
 """
 
-from typing import TypedDict, Optional, Any, Annotated, Callable, Awaitable
+import asyncio
+from typing import TYPE_CHECKING, TypedDict, Optional, Any, Annotated, Callable, Awaitable
 from dataclasses import dataclass, field
 from operator import add
 
@@ -12,6 +13,11 @@ from langchain_core.messages import BaseMessage
 
 from app.auth import AuthContext
 
+if TYPE_CHECKING:
+    from app.memory import RedisMemoryStore
+    from app.observability import AgentLogger
+    from app.tokens import TokenLimiter
+
 
 @dataclass
 class ExecutionContext:
@@ -39,6 +45,55 @@ class ExecutionContext:
     # Streaming callback — set by chat API when WebSocket streaming is active
     stream_callback: Optional[Callable[[str], Awaitable[None]]] = None
 
+    # Request-scoped component cache — limiter/logger/memory are constructed
+    # once per request and shared by run/invoke_llm/stream_llm and the agents
+    _limiter: Optional[Any] = field(default=None, repr=False)
+    _agent_logger: Optional[Any] = field(default=None, repr=False)
+    _memory: Optional[Any] = field(default=None, repr=False)
+
+    # Bookkeeping writes (usage recording, execution logs) scheduled off the
+    # response path; drained by the API layer after the response is sent
+    background_tasks: list = field(default_factory=list, repr=False)
+
+    def add_background_task(self, coro: Awaitable[Any]) -> None:
+        """Schedule a bookkeeping coroutine without blocking the response path."""
+        self.background_tasks.append(asyncio.create_task(coro))
+
+    async def drain_background_tasks(self) -> None:
+        """Wait for all scheduled background tasks to complete."""
+        if self.background_tasks:
+            tasks, self.background_tasks = self.background_tasks, []
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_limiter(self) -> "TokenLimiter":
+        """Get (and cache) the TokenLimiter for this org."""
+        if self._limiter is None:
+            from app.tokens import TokenLimiter
+            self._limiter = TokenLimiter(self.auth.org_id)
+        return self._limiter
+
+    def get_agent_logger(self) -> "AgentLogger":
+        """Get (and cache) the AgentLogger for this session."""
+        if self._agent_logger is None:
+            from app.observability import AgentLogger
+            self._agent_logger = AgentLogger(
+                org_id=self.auth.org_id,
+                user_id=self.auth.user_id,
+                session_id=self.session_id
+            )
+        return self._agent_logger
+
+    def get_memory(self) -> "RedisMemoryStore":
+        """Get (and cache) the RedisMemoryStore for this session."""
+        if self._memory is None:
+            from app.memory import RedisMemoryStore
+            self._memory = RedisMemoryStore(
+                org_id=self.auth.org_id,
+                user_id=self.auth.user_id,
+                session_id=self.session_id
+            )
+        return self._memory
+
 
 class AgentState(TypedDict):
     """
@@ -73,13 +73,26 @@ class AgentOutput(BaseModel):
     # Optional metadata
     sources: Optional[list[str]] = None
     suggestions: Optional[list[str]] = None
-    
+
+    def dump(self) -> dict:
+        """
+        Serialize for transport: JSON-native types only, None fields dropped.
+
+        mode="json" lets pydantic's compiled serializer coerce datetimes and
+        Decimals up front, so the downstream JSON layer never falls back to
+        `default=str`; exclude_none keeps the payload smaller on the wire.
+        """
+        return self.model_dump(mode="json", exclude_none=True)
+
     @classmethod
     def text_response(cls, summary: str, confidence: float = 0.9) -> "AgentOutput":
-        """Create a simple text response."""
+        """Create a simple text response.
+
+        `summary` is the authoritative text — it is not duplicated into the
+        payload, so the frame doesn't ship the largest field twice.
+        """
         return cls(
             type="text",
-            payload={"content": summary},
             summary=summary,
             confidence=confidence
         )
@@ -203,10 +216,9 @@ class AgentOutput(BaseModel):
         
         return cls(
             type="text",
-            payload={
-                "analytics": analytics.model_dump(),
-                "content": summary
-            },
+            # summary is the authoritative text; only the structured
+            # sections ride in the payload
+            payload={"analytics": analytics.model_dump()},
             summary=summary,
             confidence=confidence,
             suggestions=analytics.follow_ups
@@ -6,21 +6,73 @@ business planning, forecasting, and strategic advice using LLM-based tool
 selection and token-by-token streaming.
 """
 
+import asyncio
 import logging
-import json
+import re
 from typing import Optional
 from datetime import datetime
+from operator import itemgetter
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage
 
 from app.agents.base import BaseAgent
 from app.agents.base.context import AgentState
 from app.agents.base.output import AgentOutput, AnalyticsSection, ChartBlock, TableData
-from app.agents.prompts import ANALYTICS_AGENT_PROMPT, TOOL_SELECTION_PROMPT
-from app.memory import RedisMemoryStore
+from app.agents.prompts import ANALYTICS_AGENT_PROMPT
+from app.serialization import json_dumps
+from app.tools.analytics import get_analytics_tools
+from app.tools.forecasting import get_forecasting_tools
+from app.tools.alerts import get_alerts_tools
 
 logger = logging.getLogger(__name__)
 
+# Keywords that mark a question as advice/strategy rather than a data query.
+# Compiled once so detection is a single pass over the input.
+_ADVICE_WORDS = (
+    'advice', 'recommend', 'suggest', 'should', 'improve',
+    'grow', 'strategy', 'plan', 'goal', 'focus', 'priority',
+    'how to', 'what to do', 'help me', 'next step',
+)
+_ADVICE_RE = re.compile("|".join(map(re.escape, _ADVICE_WORDS)))
+
+# Bound accessor for bar-chart series — skips per-element dict.get dispatch
+_NAME_REVENUE = itemgetter("name", "revenue")
+
+# Instantiated tool sets keyed by user — tools only carry auth, so build once
+_tools_cache: dict[tuple[str, str, str], list] = {}
+
+
+def _get_all_tools(auth) -> list:
+    """Get (and cache) the full analytics tool set for a user."""
+    key = (auth.org_id, auth.user_id, auth.role)
+    tools = _tools_cache.get(key)
+    if tools is None:
+        if len(_tools_cache) > 1024:
+            _tools_cache.clear()
+        tools = (
+            get_analytics_tools(auth) +
+            get_forecasting_tools(auth) +
+            get_alerts_tools(auth)
+        )
+        _tools_cache[key] = tools
+    return tools
+
+
+def _money_fmt(value) -> str:
+    return f"${value:,.2f}"
+
+
+# Key-metric extraction table: (tool_name, result_key, metric_label, formatter).
+# The structure is fixed, so _parse_response iterates this once instead of
+# branching per metric.
+METRIC_EXTRACTORS = (
+    ("get_order_summary", "total_orders", "Total Orders", None),
+    ("get_order_summary", "total_revenue", "Revenue", _money_fmt),
+    ("get_order_summary", "unique_customers", "Customers", None),
+    ("get_inventory_summary", "total_products", "Products", None),
+    ("get_inventory_summary", "total_units", "Total Units", None),
+)
+
 
 class AnalyticsAgent(BaseAgent):
     """Analytics, strategy, and business planning specialist agent."""
@@ -28,60 +80,54 @@ class AnalyticsAgent(BaseAgent):
     name = "analytics_agent"
     description = "Handles business analytics, strategy, and planning questions"
     system_prompt = ANALYTICS_AGENT_PROMPT
-    
+
+    # Fallback tools when LLM selection fails
+    default_tools = ["get_order_summary", "get_inventory_summary"]
+
     async def execute(self, state: AgentState) -> AgentState:
         """Execute analytics agent with LLM-based tool selection and streaming."""
         context = state["context"]
         user_input = state["input"]
+        user_input_lower = user_input.lower()
         stream_callback = getattr(context, 'stream_callback', None)
         
-        # Initialize memory
-        memory = RedisMemoryStore(
-            org_id=context.auth.org_id,
-            user_id=context.auth.user_id,
-            session_id=context.session_id
-        )
-        
-        # Get conversation history
-        memory_messages = await memory.get_context_messages(max_messages=10)
-        
-        # Load all available tools
-        from app.tools.analytics import get_analytics_tools
-        from app.tools.forecasting import get_forecasting_tools
-        from app.tools.alerts import get_alerts_tools
-        
-        all_tools = (
-            get_analytics_tools(context.auth) +
-            get_forecasting_tools(context.auth) +
-            get_alerts_tools(context.auth)
+        # Initialize memory (cached on context for the request)
+        memory = context.get_memory()
+
+        # Load all available tools (cached per user)
+        all_tools = _get_all_tools(context.auth)
+
+        # === MEMORY FETCH + LLM-BASED TOOL SELECTION (independent I/O, run concurrently) ===
+        memory_messages, tools_to_run = await asyncio.gather(
+            memory.get_context_messages(max_messages=10),
+            self._select_tools(state, all_tools, user_input),
         )
         
-        # === LLM-BASED TOOL SELECTION ===
-        tools_to_run = await self._select_tools(state, all_tools, user_input)
-        
         # Execute selected tools
         tool_results = await self.execute_tools(state, all_tools, tools_to_run)
         
         # Check for empty data
         if self.is_empty_data(tool_results):
             output = self.create_empty_data_response()
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", output.summary)
+            state["output"] = output.dump()
+            await memory.add_messages([
+                ("user", user_input),
+                ("assistant", output.summary),
+            ])
             return state
         
-        # Build LLM prompt with tool results
-        tool_context = "\n\n".join([
-            f"**{name}**:\n{json.dumps(data, default=str, indent=2)}"
-            for name, data in tool_results.items()
-        ])
+        # Build LLM prompt with tool results. Compact JSON (no indent) and
+        # capped lists keep prompt tokens proportional to what the analysis
+        # can actually use, not to tenant size.
+        parts = []
+        for name, data in self.truncate_for_llm(tool_results).items():
+            parts.append(f"**{name}**:\n")
+            parts.append(json_dumps(data))
+            parts.append("\n\n")
+        tool_context = "".join(parts)
         
         # Detect query type for tailored prompting
-        is_advice_query = any(word in user_input.lower() for word in [
-            'advice', 'recommend', 'suggest', 'should', 'improve',
-            'grow', 'strategy', 'plan', 'goal', 'focus', 'priority',
-            'how to', 'what to do', 'help me', 'next step',
-        ])
+        is_advice_query = bool(_ADVICE_RE.search(user_input_lower))
         
         if is_advice_query:
             analysis_prompt = (
@@ -110,71 +156,26 @@ class AnalyticsAgent(BaseAgent):
         
         # Parse and structure output
         output = self._parse_response(response_text, tool_results)
-        state["output"] = output.model_dump()
-        
-        # Update memory
-        await memory.add_message("user", user_input)
-        await memory.add_message("assistant", output.summary)
+        state["output"] = output.dump()
         
+        # Update memory off the response path (drained at the request boundary)
+        context.add_background_task(memory.add_messages([
+            ("user", user_input),
+            ("assistant", output.summary),
+        ]))
+
         return state
     
-    async def _select_tools(self, state: AgentState, tools: list, user_input: str) -> list[str]:
-        """Use LLM to intelligently select which tools to run."""
-        tool_descriptions = "\n".join([
-            f"- {tool.name}: {tool.description}" for tool in tools
-        ])
-        
-        prompt = TOOL_SELECTION_PROMPT.format(
-            tool_descriptions=tool_descriptions,
-            user_question=user_input
-        )
-        
-        try:
-            from app.llms import get_model_for_task
-            model, _ = get_model_for_task("tool_selection")
-            
-            response = await model.ainvoke([
-                SystemMessage(content="You are a tool selection assistant. Return only a JSON array of tool names."),
-                HumanMessage(content=prompt)
-            ])
-            
-            text = response.content if hasattr(response, 'content') else str(response)
-            # Extract JSON array from response
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            
-            selected = json.loads(text)
-            if isinstance(selected, list) and len(selected) > 0:
-                logger.info(f"LLM selected tools: {selected}")
-                return selected[:4]  # Max 4 tools
-        except Exception as e:
-            logger.warning(f"LLM tool selection failed, using defaults: {e}")
-        
-        # Fallback: default tools if LLM selection fails
-        return ["get_order_summary", "get_inventory_summary"]
-    
     def _parse_response(self, response_text: str, tool_results: dict) -> AgentOutput:
         """Parse LLM response into structured output with charts/tables."""
-        # Build key metrics from tool results
+        # Build key metrics from tool results via the extractor table
         key_metrics = []
-        
-        order_summary = tool_results.get("get_order_summary", {})
-        if order_summary:
-            if "total_orders" in order_summary:
-                key_metrics.append({"name": "Total Orders", "value": order_summary["total_orders"]})
-            if "total_revenue" in order_summary:
-                key_metrics.append({"name": "Revenue", "value": f"${order_summary['total_revenue']:,.2f}"})
-            if "unique_customers" in order_summary:
-                key_metrics.append({"name": "Customers", "value": order_summary["unique_customers"]})
-        
-        inv_summary = tool_results.get("get_inventory_summary", {})
-        if inv_summary:
-            if "total_products" in inv_summary:
-                key_metrics.append({"name": "Products", "value": inv_summary["total_products"]})
-            if "total_units" in inv_summary:
-                key_metrics.append({"name": "Total Units", "value": inv_summary["total_units"]})
-        
+        for tool_name, key, label, fmt in METRIC_EXTRACTORS:
+            data = tool_results.get(tool_name)
+            if data and key in data:
+                value = data[key]
+                key_metrics.append({"name": label, "value": fmt(value) if fmt else value})
+
         # If no metrics extracted, return simple text response
         if not key_metrics:
             return AgentOutput.text_response(summary=response_text, confidence=0.85)
@@ -191,26 +192,28 @@ class AnalyticsAgent(BaseAgent):
             data_points = revenue_data["data"]
             if len(data_points) >= 3:
                 period_type = revenue_data.get('period_type', 'day')
+                xs, ys = _build_series(data_points, "revenue", period_type)
                 analytics.charts.append(ChartBlock(
                     chart_type="line",
                     title=f"Revenue Trend ({period_type.capitalize()}ly)",
-                    x=[_format_period_label(d.get("period", ""), period_type) for d in data_points],
-                    y=[float(d.get("revenue", 0)) for d in data_points],
+                    x=xs,
+                    y=ys,
                     x_label="Period",
                     y_label="Revenue ($)",
                 ))
-        
+
         # Add AOV chart if available
         aov_data = tool_results.get("get_aov_trend", {})
         if aov_data and isinstance(aov_data.get("data"), list):
             data_points = aov_data["data"]
             if len(data_points) >= 3:
                 period_type = aov_data.get('period_type', 'week')
+                xs, ys = _build_series(data_points, "aov", period_type)
                 analytics.charts.append(ChartBlock(
                     chart_type="line",
                     title="Average Order Value Trend",
-                    x=[_format_period_label(d.get("period", ""), period_type) for d in data_points],
-                    y=[float(d.get("aov", 0)) for d in data_points],
+                    x=xs,
+                    y=ys,
                     x_label="Period",
                     y_label="AOV ($)",
                 ))
@@ -220,11 +223,17 @@ class AnalyticsAgent(BaseAgent):
         if rev_by_product and isinstance(rev_by_product.get("products"), list):
             prods = [p for p in rev_by_product["products"] if p.get("revenue", 0) > 0][:8]
             if len(prods) >= 2:
+                xs = [None] * len(prods)
+                ys = [None] * len(prods)
+                for i, p in enumerate(prods):
+                    name, revenue = _NAME_REVENUE(p)
+                    xs[i] = name
+                    ys[i] = float(revenue)
                 analytics.charts.append(ChartBlock(
                     chart_type="bar",
                     title="Revenue by Product",
-                    x=[p["name"] for p in prods],
-                    y=[float(p["revenue"]) for p in prods],
+                    x=xs,
+                    y=ys,
                     y_label="Revenue ($)",
                 ))
 
@@ -253,6 +262,25 @@ class AnalyticsAgent(BaseAgent):
         return AgentOutput.analytics_response(analytics=analytics, confidence=0.85)
 
 
+# Frontend charts can't usefully draw more points than this; long series are
+# strided down so extraction cost stays bounded regardless of result size
+_MAX_CHART_POINTS = 200
+
+
+def _build_series(data_points: list, value_key: str, period_type: str) -> tuple[list[str], list[float]]:
+    """Build chart x/y lists from time-series points in a single pre-sized pass."""
+    if len(data_points) > _MAX_CHART_POINTS:
+        step = -(-len(data_points) // _MAX_CHART_POINTS)  # ceil division
+        data_points = data_points[::step]
+    n = len(data_points)
+    xs: list = [None] * n
+    ys: list = [None] * n
+    for i, d in enumerate(data_points):
+        xs[i] = _format_period_label(d.get("period", ""), period_type)
+        ys[i] = float(d.get(value_key, 0))
+    return xs, ys
+
+
 def _format_period_label(period_str: str, period_type: str) -> str:
     """Convert ISO timestamp to a short, readable chart label."""
     if not period_str:
@@ -5,20 +5,91 @@ Handles inventory, warehouse management, and supply chain queries.
 Uses LLM-based tool selection and token-by-token streaming.
 """
 
+import asyncio
 import logging
-import json
+import re
+from dataclasses import dataclass
+from operator import itemgetter
 from typing import Optional
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage
 
 from app.agents.base import BaseAgent
 from app.agents.base.context import AgentState
 from app.agents.base.output import AgentOutput, AnalyticsSection, TableData
-from app.agents.prompts import INVENTORY_AGENT_PROMPT, TOOL_SELECTION_PROMPT
-from app.memory import RedisMemoryStore
+from app.agents.prompts import INVENTORY_AGENT_PROMPT
+from app.cache import get_cached_analysis, store_analysis, tool_fingerprint
+from app.serialization import json_dumps
+from app.tools.inventory import get_inventory_tools
+from app.tools.alerts import get_alerts_tools
+from app.tools.forecasting import get_forecasting_tools
 
 logger = logging.getLogger(__name__)
 
+# Bound row accessors — one tuple unpack per row instead of per-key .get hashing
+_STOCK_ROW = itemgetter("name", "warehouse_name", "quantity")
+_WAREHOUSE_ROW = itemgetter("name", "product_count", "total_units")
+
+# Rule tier for tool selection: unambiguous phrasings skip the LLM entirely
+_KEYWORD_ROUTES = (
+    (re.compile(r"low\s*stock|running\s+(?:out|low)|out\s+of\s+stock"), ("get_product_stock", "low_stock_alerts")),
+    (re.compile(r"reorder|restock"), ("reorder_point_calculator", "get_product_stock")),
+    (re.compile(r"warehouse"), ("get_warehouse_list",)),
+    (re.compile(r"overstock"), ("get_overstock_detection",)),
+    (re.compile(r"stock\s+movement"), ("get_stock_movement",)),
+    (re.compile(r"inventory\s+health"), ("inventory_health_report",)),
+    (re.compile(r"forecast|demand"), ("demand_forecast",)),
+)
+
+@dataclass(slots=True)
+class _InventoryView:
+    """Single-pass projection of tool_results for response parsing."""
+    total_products: Optional[int] = None
+    low_stock_count: Optional[int] = None
+    products: Optional[list] = None
+    warehouses: Optional[list] = None
+    health_score: Optional[float] = None
+
+    @classmethod
+    def from_results(cls, tool_results: dict) -> "_InventoryView":
+        view = cls()
+        for name, data in tool_results.items():
+            if not isinstance(data, dict):
+                continue
+            if name == "get_product_stock":
+                view.total_products = data.get("total_products")
+                view.low_stock_count = data.get("low_stock_count")
+                products = data.get("products")
+                if isinstance(products, list):
+                    view.products = products
+            elif name == "get_warehouse_list":
+                warehouses = data.get("warehouses")
+                if isinstance(warehouses, list):
+                    view.warehouses = warehouses
+            elif name == "inventory_health_report":
+                view.health_score = data.get("health_score")
+        return view
+
+
+# Instantiated tool sets keyed by user — tools only carry auth, so build once
+_tools_cache: dict[tuple[str, str, str], list] = {}
+
+
+def _get_all_tools(auth) -> list:
+    """Get (and cache) the full inventory tool set for a user."""
+    key = (auth.org_id, auth.user_id, auth.role)
+    tools = _tools_cache.get(key)
+    if tools is None:
+        if len(_tools_cache) > 1024:
+            _tools_cache.clear()
+        tools = (
+            get_inventory_tools(auth) +
+            get_alerts_tools(auth) +
+            get_forecasting_tools(auth)
+        )
+        _tools_cache[key] = tools
+    return tools
+
 
 class InventoryAgent(BaseAgent):
     """Inventory, warehouse, and supply chain specialist agent."""
@@ -26,6 +97,12 @@ class InventoryAgent(BaseAgent):
     name = "inventory_agent"
     description = "Handles inventory and warehouse questions"
     system_prompt = INVENTORY_AGENT_PROMPT
+
+    # Fallback tools when LLM selection fails
+    default_tools = ["get_product_stock", "get_warehouse_list"]
+
+    # Keyword fast paths checked before LLM tool selection
+    keyword_routes = _KEYWORD_ROUTES
     
     async def execute(self, state: AgentState) -> AgentState:
         """Execute inventory agent with LLM-based tool selection and streaming."""
@@ -33,30 +110,18 @@ class InventoryAgent(BaseAgent):
         user_input = state["input"]
         stream_callback = getattr(context, 'stream_callback', None)
         
-        # Initialize memory
-        memory = RedisMemoryStore(
-            org_id=context.auth.org_id,
-            user_id=context.auth.user_id,
-            session_id=context.session_id
-        )
-        
-        # Get conversation history
-        memory_messages = await memory.get_context_messages(max_messages=10)
-        
-        # Load all available tools
-        from app.tools.inventory import get_inventory_tools
-        from app.tools.alerts import get_alerts_tools
-        from app.tools.forecasting import get_forecasting_tools
+        # Initialize memory (cached on context for the request)
+        memory = context.get_memory()
         
-        all_tools = (
-            get_inventory_tools(context.auth) +
-            get_alerts_tools(context.auth) +
-            get_forecasting_tools(context.auth)
+        # Load all available tools (cached per user)
+        all_tools = _get_all_tools(context.auth)
+
+        # === MEMORY FETCH + LLM-BASED TOOL SELECTION (independent I/O, run concurrently) ===
+        memory_messages, tools_to_run = await asyncio.gather(
+            memory.get_context_messages(max_messages=10),
+            self._select_tools(state, all_tools, user_input),
         )
         
-        # === LLM-BASED TOOL SELECTION ===
-        tools_to_run = await self._select_tools(state, all_tools, user_input)
-        
         # Build extra kwargs for specific tools
         extra_kwargs = {}
         user_lower = user_input.lower()
@@ -69,16 +134,22 @@ class InventoryAgent(BaseAgent):
         # Check for empty data
         if self.is_empty_data(tool_results):
             output = self.create_empty_data_response()
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", output.summary)
+            state["output"] = output.dump()
+            await memory.add_messages([
+                ("user", user_input),
+                ("assistant", output.summary),
+            ])
             return state
         
-        # Build LLM prompt with tool results
-        tool_context = "\n\n".join([
-            f"**{name}**:\n{json.dumps(data, default=str, indent=2)}"
-            for name, data in tool_results.items()
-        ])
+        # Build LLM prompt with tool results. Compact JSON (no indent) and
+        # capped lists keep prompt tokens proportional to what the analysis
+        # can actually use, not to tenant size.
+        parts = []
+        for name, data in self.truncate_for_llm(tool_results).items():
+            parts.append(f"**{name}**:\n")
+            parts.append(json_dumps(data))
+            parts.append("\n\n")
+        tool_context = "".join(parts)
         
         analysis_prompt = (
             f"Analyze this inventory data and provide insights. Focus on issues that "
@@ -90,121 +161,103 @@ class InventoryAgent(BaseAgent):
         messages = self.format_messages(state, memory_messages)
         messages.append(HumanMessage(content=analysis_prompt))
         
-        # === STREAMING OR STANDARD RESPONSE ===
-        if stream_callback:
-            response_text, usage = await self.stream_llm(state, messages, stream_callback)
+        # === STREAMING OR STANDARD RESPONSE (cached per data snapshot) ===
+        fingerprint = tool_fingerprint(tool_context)
+        response_text = await get_cached_analysis(user_input, fingerprint)
+        if response_text is not None:
+            # Replay so streaming clients still receive the text
+            if stream_callback:
+                await stream_callback(response_text)
         else:
-            response_obj, usage = await self.invoke_llm(state, messages)
-            response_text = response_obj.content if hasattr(response_obj, 'content') else str(response_obj)
+            if stream_callback:
+                response_text, usage = await self.stream_llm(state, messages, stream_callback)
+            else:
+                response_obj, usage = await self.invoke_llm(state, messages)
+                response_text = response_obj.content if hasattr(response_obj, 'content') else str(response_obj)
+            context.add_background_task(store_analysis(user_input, fingerprint, response_text))
         
         # Parse and structure output
         output = self._parse_response(response_text, tool_results)
-        state["output"] = output.model_dump()
+        state["output"] = output.dump()
         
-        # Update memory
-        await memory.add_message("user", user_input)
-        await memory.add_message("assistant", output.summary)
+        # Update memory off the response path (drained at the request boundary)
+        context.add_background_task(memory.add_messages([
+            ("user", user_input),
+            ("assistant", output.summary),
+        ]))
         
         return state
     
-    async def _select_tools(self, state: AgentState, tools: list, user_input: str) -> list[str]:
-        """Use LLM to intelligently select which tools to run."""
-        tool_descriptions = "\n".join([
-            f"- {tool.name}: {tool.description}" for tool in tools
-        ])
-        
-        prompt = TOOL_SELECTION_PROMPT.format(
-            tool_descriptions=tool_descriptions,
-            user_question=user_input
-        )
-        
-        try:
-            from app.llms import get_model_for_task
-            model, _ = get_model_for_task("tool_selection")
-            
-            response = await model.ainvoke([
-                SystemMessage(content="You are a tool selection assistant. Return only a JSON array of tool names."),
-                HumanMessage(content=prompt)
-            ])
-            
-            text = response.content if hasattr(response, 'content') else str(response)
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            
-            selected = json.loads(text)
-            if isinstance(selected, list) and len(selected) > 0:
-                logger.info(f"LLM selected tools: {selected}")
-                return selected[:4]
-        except Exception as e:
-            logger.warning(f"LLM tool selection failed, using defaults: {e}")
-        
-        # Fallback defaults
-        return ["get_product_stock", "get_warehouse_list"]
-    
     def _parse_response(self, response_text: str, tool_results: dict) -> AgentOutput:
         """Parse LLM response into structured output with tables."""
-        # Build key metrics from tool results
+        # Project tool results once; metric and table stages read the view
+        view = _InventoryView.from_results(tool_results)
+
         key_metrics = []
-        
-        stock_data = tool_results.get("get_product_stock", {})
-        if stock_data:
-            if "total_products" in stock_data:
-                key_metrics.append({"name": "Products Tracked", "value": stock_data["total_products"]})
-            if "low_stock_count" in stock_data:
-                key_metrics.append({"name": "Low Stock Items", "value": stock_data["low_stock_count"]})
-        
-        wh_data = tool_results.get("get_warehouse_list", {})
-        if wh_data and isinstance(wh_data.get("warehouses"), list):
-            key_metrics.append({"name": "Warehouses", "value": len(wh_data["warehouses"])})
-        
-        health_data = tool_results.get("inventory_health_report", {})
-        if health_data:
-            if "health_score" in health_data:
-                key_metrics.append({"name": "Health Score", "value": f"{health_data['health_score']}%"})
-        
+        if view.total_products is not None:
+            key_metrics.append({"name": "Products Tracked", "value": view.total_products})
+        if view.low_stock_count is not None:
+            key_metrics.append({"name": "Low Stock Items", "value": view.low_stock_count})
+        if view.warehouses is not None:
+            key_metrics.append({"name": "Warehouses", "value": len(view.warehouses)})
+        if view.health_score is not None:
+            key_metrics.append({"name": "Health Score", "value": f"{view.health_score}%"})
+
         # If no metrics, return simple text response
         if not key_metrics:
             return AgentOutput.text_response(summary=response_text, confidence=0.85)
-        
+
         analytics = AnalyticsSection(
             overview=response_text,
             key_metrics=key_metrics,
         )
-        
+
         # Add stock table if available
-        if stock_data and isinstance(stock_data.get("products"), list):
-            products = stock_data["products"]
-            if len(products) > 0:
-                analytics.detailed_breakdown = TableData(
-                    title="Stock Levels",
-                    columns=["Product", "Warehouse", "Quantity", "Status"],
-                    rows=[
-                        [
-                            p.get("name", ""),
-                            p.get("warehouse_name", ""),
-                            str(p.get("quantity", 0)),
-                            "⚠️ Low" if p.get("quantity", 0) < 10 else "✓ OK"
-                        ]
-                        for p in products[:10]
+        if view.products:
+            products = view.products
+            try:
+                rows = [
+                    [name, wh, str(qty), "⚠️ Low" if qty < 10 else "✓ OK"]
+                    for name, wh, qty in map(_STOCK_ROW, products[:10])
+                ]
+            except KeyError:
+                # Partial rows: fall back to the tolerant per-key path
+                rows = [
+                    [
+                        p.get("name", ""),
+                        p.get("warehouse_name", ""),
+                        str(p.get("quantity", 0)),
+                        "⚠️ Low" if p.get("quantity", 0) < 10 else "✓ OK"
                     ]
-                )
-        
+                    for p in products[:10]
+                ]
+            analytics.detailed_breakdown = TableData(
+                title="Stock Levels",
+                columns=["Product", "Warehouse", "Quantity", "Status"],
+                rows=rows,
+            )
+
         # If no stock table, check warehouse list
-        if not analytics.detailed_breakdown and wh_data and isinstance(wh_data.get("warehouses"), list):
-            warehouses = wh_data["warehouses"]
-            if len(warehouses) > 0:
-                analytics.detailed_breakdown = TableData(
-                    title="Warehouses",
-                    columns=["Warehouse", "Products", "Total Units"],
-                    rows=[
-                        [
-                            w.get("name", ""),
-                            str(w.get("product_count", 0)),
-                            str(w.get("total_units", 0)),
-                        ]
-                        for w in warehouses[:8]
+        if not analytics.detailed_breakdown and view.warehouses:
+            warehouses = view.warehouses
+            try:
+                rows = [
+                    [name, str(count), str(units)]
+                    for name, count, units in map(_WAREHOUSE_ROW, warehouses[:8])
+                ]
+            except KeyError:
+                rows = [
+                    [
+                        w.get("name", ""),
+                        str(w.get("product_count", 0)),
+                        str(w.get("total_units", 0)),
                     ]
-                )
+                    for w in warehouses[:8]
+                ]
+            analytics.detailed_breakdown = TableData(
+                title="Warehouses",
+                columns=["Warehouse", "Products", "Total Units"],
+                rows=rows,
+            )
         
         return AgentOutput.analytics_response(analytics=analytics, confidence=0.85)
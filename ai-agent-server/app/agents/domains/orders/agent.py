@@ -6,8 +6,12 @@ Uses LLM-based tool selection, action confirmation workflow,
 and token-by-token streaming.
 """
 
+import asyncio
+import hashlib
 import logging
-import json
+import re
+from dataclasses import dataclass
+from operator import itemgetter
 from typing import Optional
 
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -15,12 +19,117 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from app.agents.base import BaseAgent
 from app.agents.base.context import AgentState
 from app.agents.base.output import AgentOutput, AnalyticsSection, TableData
-from app.agents.prompts import ORDERS_AGENT_PROMPT, TOOL_SELECTION_PROMPT
+from app.agents.prompts import ORDERS_AGENT_PROMPT, PARAM_EXTRACTION_SYSTEM_PROMPT
+from app.cache import get_cached_analysis, store_analysis, tool_fingerprint
+from app.llms import get_cached_model_for_task
 from app.memory import RedisMemoryStore
+from app.memory.redis_memory import get_redis_client
+from app.serialization import json_dumps, json_loads
 from app.tools.base import ActionStatus
+from app.tools.orders import get_orders_tools
+from app.tools.alerts import get_alerts_tools
+from app.tools.actions import get_action_tools
 
 logger = logging.getLogger(__name__)
 
+# Bound row accessors and money formatter — avoids per-key .get hashing and
+# f-string format dispatch in the row-building loops
+_ORDER_ROW = itemgetter("order_id", "customer_name", "status", "total_amount")
+_CUSTOMER_ROW = itemgetter("customer_name", "order_count", "total_spent")
+_money = "${:,.2f}".format
+
+# Extracts the JSON object from an extraction response, wherever it sits —
+# robust to code fences (single- or multi-line) and surrounding prose
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+# Rule tier for tool selection: unambiguous phrasings skip the LLM entirely.
+# Action verbs are deliberately left to the LLM so the confirmation workflow
+# still sees them — _ACTION_VERB_RE below disables the tier for any input
+# containing one ("cancel my pending order" must not route to a read-only
+# order list)
+_ACTION_VERB_RE = re.compile(r"\b(?:create|cancel|update|change|mark|set)\b")
+
+_KEYWORD_ROUTES = (
+    (re.compile(r"pending\s+orders?|recent\s+orders?|order\s+list"), ("get_order_list",)),
+    (re.compile(r"order\s+status|status\s+breakdown"), ("get_order_status_breakdown",)),
+    (re.compile(r"top\s+customers?|best\s+customers?"), ("get_top_customers",)),
+    (re.compile(r"customer\s+history"), ("get_customer_history",)),
+)
+
+# Confirmation vocabulary for pending actions — frozen at import so the
+# per-request check is a single normalize + O(1) membership test
+_CONFIRM_WORDS = frozenset({
+    'yes', 'yeah', 'yep', 'sure', 'confirm', 'ok', 'okay',
+    'proceed', 'do it', 'go ahead', 'y',
+})
+_CANCEL_WORDS = frozenset({
+    'no', 'nope', 'cancel', 'stop', 'never mind', 'nevermind', 'n',
+})
+
+@dataclass(slots=True)
+class _OrdersView:
+    """Single-pass projection of tool_results for response parsing."""
+    statuses: Optional[list] = None
+    total_count: Optional[int] = None
+    orders: Optional[list] = None
+    customers: Optional[list] = None
+
+    @classmethod
+    def from_results(cls, tool_results: dict) -> "_OrdersView":
+        view = cls()
+        for name, data in tool_results.items():
+            if not isinstance(data, dict):
+                continue
+            if name == "get_order_list":
+                view.total_count = data.get("total_count")
+                orders = data.get("orders")
+                if isinstance(orders, list):
+                    view.orders = orders
+            elif name == "get_order_status_breakdown":
+                statuses = data.get("statuses")
+                if isinstance(statuses, list):
+                    view.statuses = statuses
+            elif name == "get_top_customers":
+                customers = data.get("customers")
+                if isinstance(customers, list):
+                    view.customers = customers
+        return view
+
+
+# Instantiated tool sets keyed by user — tools only carry auth, so build once
+_tools_cache: dict[tuple[str, str, str], tuple[list, list, list]] = {}
+
+
+def _get_tool_sets(auth) -> tuple[list, list, list]:
+    """Get (and cache) the order, alert, and action tool sets for a user."""
+    key = (auth.org_id, auth.user_id, auth.role)
+    tool_sets = _tools_cache.get(key)
+    if tool_sets is None:
+        if len(_tools_cache) > 1024:
+            _tools_cache.clear()
+        tool_sets = (
+            get_orders_tools(auth),
+            get_alerts_tools(auth),
+            get_action_tools(auth),
+        )
+        _tools_cache[key] = tool_sets
+    return tool_sets
+
+
+_action_tools_by_name_cache: dict[tuple[str, str, str], dict] = {}
+
+
+def _get_action_tools_by_name(auth) -> dict:
+    """Get (and cache) the user's action tools keyed by name for O(1) lookup."""
+    key = (auth.org_id, auth.user_id, auth.role)
+    by_name = _action_tools_by_name_cache.get(key)
+    if by_name is None:
+        if len(_action_tools_by_name_cache) > 1024:
+            _action_tools_by_name_cache.clear()
+        by_name = {t.name: t for t in _get_tool_sets(auth)[2]}
+        _action_tools_by_name_cache[key] = by_name
+    return by_name
+
 
 class OrdersAgent(BaseAgent):
     """Sales, orders, and customer specialist agent."""
@@ -28,6 +137,13 @@ class OrdersAgent(BaseAgent):
     name = "orders_agent"
     description = "Handles orders and customer questions"
     system_prompt = ORDERS_AGENT_PROMPT
+
+    # Fallback tools when LLM selection fails
+    default_tools = ["get_order_list", "get_order_status_breakdown"]
+
+    # Keyword fast paths checked before LLM tool selection
+    keyword_routes = _KEYWORD_ROUTES
+    keyword_route_guard = _ACTION_VERB_RE
     
     async def execute(self, state: AgentState) -> AgentState:
         """Execute orders agent with action handling, LLM tool selection, and streaming."""
@@ -35,13 +151,19 @@ class OrdersAgent(BaseAgent):
         user_input = state["input"]
         stream_callback = getattr(context, 'stream_callback', None)
         
-        # Initialize memory
-        memory = RedisMemoryStore(
-            org_id=context.auth.org_id,
-            user_id=context.auth.user_id,
-            session_id=context.session_id
-        )
-        
+        # Initialize memory (cached on context for the request)
+        memory = context.get_memory()
+
+        # Load all available tools (cached per user)
+        order_tools, alert_tools, action_tools = _get_tool_sets(context.auth)
+        all_tools = order_tools + alert_tools + action_tools
+
+        # Speculatively start tool selection and the memory fetch — almost no
+        # requests have a pending action, so the fast path shouldn't wait for
+        # that check before kicking off the selection LLM call
+        select_task = asyncio.create_task(self._select_tools(state, all_tools, user_input))
+        memory_task = asyncio.create_task(memory.get_context_messages(max_messages=10))
+
         # === CHECK FOR PENDING ACTION CONFIRMATION ===
         pending_action = await memory.get_pending_action()
         if pending_action:
@@ -49,23 +171,12 @@ class OrdersAgent(BaseAgent):
                 state, memory, pending_action, user_input
             )
             if result is not None:
+                # Action path taken — the speculative work is unused
+                select_task.cancel()
+                memory_task.cancel()
                 return result
-        
-        # Get conversation history
-        memory_messages = await memory.get_context_messages(max_messages=10)
-        
-        # Load all available tools
-        from app.tools.orders import get_orders_tools
-        from app.tools.alerts import get_alerts_tools
-        from app.tools.actions import get_action_tools
-        
-        order_tools = get_orders_tools(context.auth)
-        alert_tools = get_alerts_tools(context.auth)
-        action_tools = get_action_tools(context.auth)
-        all_tools = order_tools + alert_tools + action_tools
-        
-        # === LLM-BASED TOOL SELECTION ===
-        tools_to_run = await self._select_tools(state, all_tools, user_input)
+
+        memory_messages, tools_to_run = await asyncio.gather(memory_task, select_task)
         
         # Check if any selected tools are ActionTools
         action_tool_names = {t.name for t in action_tools}
@@ -74,7 +185,7 @@ class OrdersAgent(BaseAgent):
         # === HANDLE ACTION TOOLS (with confirmation workflow) ===
         if selected_action_tools:
             result = await self._handle_action_tools(
-                state, memory, action_tools, selected_action_tools, user_input
+                state, memory, selected_action_tools, user_input
             )
             if result is not None:
                 return result
@@ -89,16 +200,22 @@ class OrdersAgent(BaseAgent):
         # Check for empty data
         if self.is_empty_data(tool_results):
             output = self.create_empty_data_response()
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", output.summary)
+            state["output"] = output.dump()
+            await memory.add_messages([
+                ("user", user_input),
+                ("assistant", output.summary),
+            ])
             return state
         
-        # Build LLM prompt with tool results
-        tool_context = "\n\n".join([
-            f"**{name}**:\n{json.dumps(data, default=str, indent=2)}"
-            for name, data in tool_results.items()
-        ])
+        # Build LLM prompt with tool results. Compact JSON (no indent) and
+        # capped lists keep prompt tokens proportional to what the analysis
+        # can actually use, not to tenant size.
+        parts = []
+        for name, data in self.truncate_for_llm(tool_results).items():
+            parts.append(f"**{name}**:\n")
+            parts.append(json_dumps(data))
+            parts.append("\n\n")
+        tool_context = "".join(parts)
         
         analysis_prompt = (
             f"Analyze this order/customer data and provide insights. "
@@ -111,21 +228,31 @@ class OrdersAgent(BaseAgent):
         messages = self.format_messages(state, memory_messages)
         messages.append(HumanMessage(content=analysis_prompt))
         
-        # === STREAMING OR STANDARD RESPONSE ===
-        if stream_callback:
-            response_text, usage = await self.stream_llm(state, messages, stream_callback)
+        # === STREAMING OR STANDARD RESPONSE (cached per data snapshot) ===
+        fingerprint = tool_fingerprint(tool_context)
+        response_text = await get_cached_analysis(user_input, fingerprint)
+        if response_text is not None:
+            # Replay so streaming clients still receive the text
+            if stream_callback:
+                await stream_callback(response_text)
         else:
-            response_obj, usage = await self.invoke_llm(state, messages)
-            response_text = response_obj.content if hasattr(response_obj, 'content') else str(response_obj)
+            if stream_callback:
+                response_text, usage = await self.stream_llm(state, messages, stream_callback)
+            else:
+                response_obj, usage = await self.invoke_llm(state, messages)
+                response_text = response_obj.content if hasattr(response_obj, 'content') else str(response_obj)
+            context.add_background_task(store_analysis(user_input, fingerprint, response_text))
         
         # Parse and structure output
         output = self._parse_response(response_text, tool_results)
-        state["output"] = output.model_dump()
-        
-        # Update memory
-        await memory.add_message("user", user_input)
-        await memory.add_message("assistant", output.summary)
+        state["output"] = output.dump()
         
+        # Update memory off the response path (drained at the request boundary)
+        context.add_background_task(memory.add_messages([
+            ("user", user_input),
+            ("assistant", output.summary),
+        ]))
+
         return state
     
     async def _handle_pending_action(
@@ -133,25 +260,22 @@ class OrdersAgent(BaseAgent):
         pending_action: dict, user_input: str
     ) -> Optional[AgentState]:
         """Handle user confirmation/cancellation of a pending action."""
-        user_lower = user_input.lower().strip()
-        
-        confirm_words = {'yes', 'yeah', 'yep', 'sure', 'confirm', 'ok', 'okay', 
-                        'proceed', 'do it', 'go ahead', 'y'}
-        cancel_words = {'no', 'nope', 'cancel', 'stop', 'never mind', 'nevermind', 'n'}
-        
-        if user_lower in confirm_words:
+        user_lower = user_input.strip().lower()
+
+        if user_lower in _CONFIRM_WORDS:
             # Execute the pending action
             return await self._confirm_action(state, memory, pending_action)
-        elif user_lower in cancel_words:
-            # Cancel the pending action
-            await memory.clear_pending_action()
+        elif user_lower in _CANCEL_WORDS:
+            # Cancel the pending action (clear + history in one round-trip)
             output = AgentOutput.text_response(
                 summary="Got it — I've cancelled that action. What else can I help you with?",
                 confidence=0.95
             )
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", output.summary)
+            state["output"] = output.dump()
+            await memory.clear_pending_with_history([
+                ("user", user_input),
+                ("assistant", output.summary),
+            ])
             return state
         
         # User said something else while action is pending — clear and process normally
@@ -166,23 +290,19 @@ class OrdersAgent(BaseAgent):
         action_type = pending_action["action_type"]
         params = pending_action["params"]
         
-        from app.tools.actions import get_action_tools
-        action_tools = get_action_tools(context.auth)
-        
-        tool = next((t for t in action_tools if t.name == action_type), None)
+        tool = _get_action_tools_by_name(context.auth).get(action_type)
         if not tool:
             output = AgentOutput.text_response(
                 summary="I couldn't find that action anymore. Please try again.",
                 confidence=0.5
             )
-            state["output"] = output.model_dump()
+            state["output"] = output.dump()
             await memory.clear_pending_action()
             return state
         
         # Execute with confirmed=True
         result = await tool.run_action(confirmed=True, **params)
-        await memory.clear_pending_action()
-        
+
         if result.success:
             summary = (
                 f"Done! {result.data.get('message', 'Action completed successfully.')} "
@@ -192,20 +312,23 @@ class OrdersAgent(BaseAgent):
             summary = f"Something went wrong: {result.error}"
         
         output = AgentOutput.text_response(summary=summary, confidence=0.9)
-        state["output"] = output.model_dump()
-        await memory.add_message("user", "yes")
-        await memory.add_message("assistant", summary)
+        state["output"] = output.dump()
+        # Clear the pending action and write history in one round-trip
+        await memory.clear_pending_with_history([
+            ("user", "yes"),
+            ("assistant", summary),
+        ])
         return state
     
     async def _handle_action_tools(
         self, state: AgentState, memory: RedisMemoryStore,
-        action_tools: list, selected_actions: list[str], user_input: str
+        selected_actions: list[str], user_input: str
     ) -> Optional[AgentState]:
         """Handle action tool execution with LLM-based parameter extraction."""
         context = state["context"]
         action_name = selected_actions[0]  # Process one action at a time
         
-        tool = next((t for t in action_tools if t.name == action_name), None)
+        tool = _get_action_tools_by_name(context.auth).get(action_name)
         if not tool:
             return None
         
@@ -221,24 +344,25 @@ class OrdersAgent(BaseAgent):
                 summary=result.data.get("prompt", "I need some more details to proceed."),
                 confidence=0.8
             )
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", output.summary)
+            state["output"] = output.dump()
+            await memory.add_messages([
+                ("user", user_input),
+                ("assistant", output.summary),
+            ])
             return state
         
         elif result.status == ActionStatus.PENDING_CONFIRMATION:
-            # Store action and ask for confirmation
-            await memory.set_pending_action(
+            # Store action and both history messages atomically in one round-trip
+            summary = result.confirmation_message or "Please confirm this action (yes/no)."
+            output = AgentOutput.text_response(summary=summary, confidence=0.9)
+            state["output"] = output.dump()
+            await memory.commit_pending(
                 action_type=action_name,
                 params=params,
-                preview_data=result.preview_data
+                preview_data=result.preview_data,
+                user_msg=user_input,
+                assistant_msg=summary,
             )
-            
-            summary = result.confirmation_message or "Please confirm this action (yes/no)."
-            output = AgentOutput.text_response(summary=summary, confidence=0.9)
-            state["output"] = output.model_dump()
-            await memory.add_message("user", user_input)
-            await memory.add_message("assistant", summary)
             return state
         
         elif result.status == ActionStatus.CANCELLED:
@@ -246,7 +370,7 @@ class OrdersAgent(BaseAgent):
                 summary=result.error or "Action cancelled.",
                 confidence=0.8
             )
-            state["output"] = output.model_dump()
+            state["output"] = output.dump()
             return state
         
         return None
@@ -258,139 +382,124 @@ class OrdersAgent(BaseAgent):
         
         if not required_fields:
             return {}
-        
+
+        # Same message + same action schema extracts the same params — check
+        # Redis before paying the LLM round-trip
+        extraction_key = "paramext:" + hashlib.sha1(
+            f"{tool.name}|{','.join(required_fields)}|{user_input.lower().strip()}".encode()
+        ).hexdigest()
+        try:
+            redis_client = await get_redis_client()
+            cached = await redis_client.get(extraction_key)
+            if cached:
+                params = json_loads(cached)
+                if isinstance(params, dict):
+                    return params
+        except Exception as e:
+            logger.debug(f"Param extraction cache read failed: {e}")
+
         fields_desc = "\n".join([
-            f"- {field}: {field_descriptions.get(field, 'required')}" 
+            f"- {field}: {field_descriptions.get(field, 'required')}"
             for field in required_fields
         ])
-        
-        prompt = (
-            f"Extract the following parameters from the user's message. "
-            f"Return a JSON object with the extracted values. "
-            f"If a value isn't mentioned, omit it from the JSON.\n\n"
-            f"Required fields:\n{fields_desc}\n\n"
-            f"User message: {user_input}\n\n"
-            f"Return ONLY a JSON object, nothing else."
-        )
-        
+
+        # Static schema in the system block, only the message dynamic — keeps
+        # the prefix identical across requests for provider prompt caching
+        system_prompt = PARAM_EXTRACTION_SYSTEM_PROMPT.format(fields_desc=fields_desc)
+
         try:
-            from app.llms import get_model_for_task
-            model, _ = get_model_for_task("tool_selection")
-            
+            model, _ = get_cached_model_for_task("tool_selection")
+
             response = await model.ainvoke([
-                SystemMessage(content="You are a parameter extraction assistant. Return only a JSON object."),
-                HumanMessage(content=prompt)
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=f"User message: {user_input}")
             ])
             
             text = response.content if hasattr(response, 'content') else str(response)
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            
-            params = json.loads(text)
+            # Grab the JSON object wherever it sits in the response
+            match = _JSON_OBJECT_RE.search(text)
+            params = json_loads(match.group(0)) if match else None
             if isinstance(params, dict):
+                try:
+                    redis_client = await get_redis_client()
+                    await redis_client.setex(extraction_key, 3600, json_dumps(params))
+                except Exception as e:
+                    logger.debug(f"Param extraction cache write failed: {e}")
                 return params
         except Exception as e:
             logger.warning(f"LLM parameter extraction failed: {e}")
         
         return {}
     
-    async def _select_tools(self, state: AgentState, tools: list, user_input: str) -> list[str]:
-        """Use LLM to intelligently select which tools to run."""
-        tool_descriptions = "\n".join([
-            f"- {tool.name}: {tool.description}" for tool in tools
-        ])
-        
-        prompt = TOOL_SELECTION_PROMPT.format(
-            tool_descriptions=tool_descriptions,
-            user_question=user_input
-        )
-        
-        try:
-            from app.llms import get_model_for_task
-            model, _ = get_model_for_task("tool_selection")
-            
-            response = await model.ainvoke([
-                SystemMessage(content="You are a tool selection assistant. Return only a JSON array of tool names."),
-                HumanMessage(content=prompt)
-            ])
-            
-            text = response.content if hasattr(response, 'content') else str(response)
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            
-            selected = json.loads(text)
-            if isinstance(selected, list) and len(selected) > 0:
-                logger.info(f"LLM selected tools: {selected}")
-                return selected[:4]
-        except Exception as e:
-            logger.warning(f"LLM tool selection failed, using defaults: {e}")
-        
-        # Fallback defaults
-        return ["get_order_list", "get_order_status_breakdown"]
-    
     def _parse_response(self, response_text: str, tool_results: dict) -> AgentOutput:
         """Parse LLM response into structured output with tables."""
-        # Build key metrics from tool results
+        # Project tool results once; metric and table stages read the view
+        view = _OrdersView.from_results(tool_results)
+
         key_metrics = []
-        
-        status_data = tool_results.get("get_order_status_breakdown", {})
-        if status_data and isinstance(status_data.get("statuses"), list):
-            for s in status_data["statuses"]:
+        if view.statuses is not None:
+            for s in view.statuses:
                 key_metrics.append({"name": s.get("status", ""), "value": s.get("count", 0)})
-        
-        order_data = tool_results.get("get_order_list", {})
-        if order_data:
-            if "total_count" in order_data:
-                key_metrics.append({"name": "Total Orders", "value": order_data["total_count"]})
-        
-        customer_data = tool_results.get("get_top_customers", {})
-        if customer_data and isinstance(customer_data.get("customers"), list):
-            key_metrics.append({"name": "Top Customers", "value": len(customer_data["customers"])})
-        
+        if view.total_count is not None:
+            key_metrics.append({"name": "Total Orders", "value": view.total_count})
+        if view.customers is not None:
+            key_metrics.append({"name": "Top Customers", "value": len(view.customers)})
+
         # If no metrics, return simple text response
         if not key_metrics:
             return AgentOutput.text_response(summary=response_text, confidence=0.85)
-        
+
         analytics = AnalyticsSection(
             overview=response_text,
             key_metrics=key_metrics,
         )
-        
+
         # Add orders table if available
-        if order_data and isinstance(order_data.get("orders"), list):
-            orders = order_data["orders"]
-            if len(orders) > 0:
-                analytics.detailed_breakdown = TableData(
-                    title="Recent Orders",
-                    columns=["Order ID", "Customer", "Status", "Amount"],
-                    rows=[
-                        [
-                            str(o.get("order_id", "")),
-                            o.get("customer_name", ""),
-                            o.get("status", ""),
-                            f"${o.get('total_amount', 0):,.2f}"
-                        ]
-                        for o in orders[:8]
+        if view.orders:
+            orders = view.orders
+            try:
+                rows = [
+                    [str(oid), customer, status, _money(amount)]
+                    for oid, customer, status, amount in map(_ORDER_ROW, orders[:8])
+                ]
+            except KeyError:
+                # Partial rows: fall back to the tolerant per-key path
+                rows = [
+                    [
+                        str(o.get("order_id", "")),
+                        o.get("customer_name", ""),
+                        o.get("status", ""),
+                        _money(o.get("total_amount", 0)),
                     ]
-                )
-        
+                    for o in orders[:8]
+                ]
+            analytics.detailed_breakdown = TableData(
+                title="Recent Orders",
+                columns=["Order ID", "Customer", "Status", "Amount"],
+                rows=rows,
+            )
+
         # If no orders table, try top customers
-        if not analytics.detailed_breakdown and customer_data and isinstance(customer_data.get("customers"), list):
-            customers = customer_data["customers"]
-            if len(customers) > 0:
-                analytics.detailed_breakdown = TableData(
-                    title="Top Customers",
-                    columns=["Customer", "Orders", "Total Spent"],
-                    rows=[
-                        [
-                            c.get("customer_name", ""),
-                            str(c.get("order_count", 0)),
-                            f"${c.get('total_spent', 0):,.2f}"
-                        ]
-                        for c in customers[:8]
+        if not analytics.detailed_breakdown and view.customers:
+            customers = view.customers
+            try:
+                rows = [
+                    [name, str(count), _money(spent)]
+                    for name, count, spent in map(_CUSTOMER_ROW, customers[:8])
+                ]
+            except KeyError:
+                rows = [
+                    [
+                        c.get("customer_name", ""),
+                        str(c.get("order_count", 0)),
+                        _money(c.get("total_spent", 0)),
                     ]
-                )
+                    for c in customers[:8]
+                ]
+            analytics.detailed_breakdown = TableData(
+                title="Top Customers",
+                columns=["Customer", "Orders", "Total Spent"],
+                rows=rows,
+            )
         
         return AgentOutput.analytics_response(analytics=analytics, confidence=0.85)
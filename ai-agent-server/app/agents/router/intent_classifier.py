@@ -6,19 +6,27 @@ Uses small model for speed and cost efficiency.
 Supports broad business question categories.
 """
 
+import asyncio
+import re
+import time
+from collections import Counter
 from typing import Optional
 from pydantic import BaseModel, Field
 
 from langchain_core.messages import HumanMessage, SystemMessage
 
-from app.llms import get_model_for_task
+from app.llms import get_cached_model_for_task
 
 
 class IntentClassification(BaseModel):
-    """Structured output for intent classification."""
+    """Structured output for intent classification.
+
+    Deliberately minimal: every extra field here is output tokens the
+    routing model must generate on every message, and decode steps
+    dominate routing latency.
+    """
     intent: str = Field(description="The classified intent category")
     confidence: float = Field(ge=0.0, le=1.0, description="Confidence score")
-    reasoning: str = Field(description="Brief explanation of classification")
 
 
 INTENT_CLASSIFICATION_PROMPT = """You are an intent classifier for Viona, a business agent.
@@ -67,24 +75,151 @@ Only use 'general' for pure greetings, meta questions about Viona itself, or com
 """
 
 
-async def classify_intent(user_message: str) -> IntentClassification:
+# Built once: message construction and structured-output wrapping are pure
+# allocation overhead when repeated per call
+_SYS_MSG = SystemMessage(content=INTENT_CLASSIFICATION_PROMPT)
+_structured_router = None
+
+
+def _get_structured_router():
+    """Get the routing model wrapped for structured output, built once."""
+    global _structured_router
+    if _structured_router is None:
+        model, _ = get_cached_model_for_task("routing")
+        _structured_router = model.with_structured_output(IntentClassification)
+    return _structured_router
+
+
+# Keyword rules distilled from INTENT_CLASSIFICATION_PROMPT — the prompt
+# already enumerates hard rules, so a compiled scan classifies the obvious
+# cases locally and only ambiguous messages pay for the routing LLM call.
+# Leading \b anchors keep stems matching (order → orders) without matching
+# inside other words (reorder stays with inventory).
+_INTENT_KEYWORDS = {
+    "analytics": (
+        "revenue", "metric", "performance", "trend", "overview", "report",
+        "alert", "anomal", "forecast", "run out", "growth", "how's my business",
+        "hows my business", "how is my business",
+    ),
+    "inventory": (
+        "stock", "inventory", "warehouse", "sku", "product", "reorder",
+        "restock", "overstock", "supply chain",
+    ),
+    "orders": (
+        "order", "customer", "purchase", "sale", "fulfil", "fulfill",
+    ),
+    "planning": (
+        "advice", "strategy", "plan", "goal", "grow my business", "focus on",
+        "improve", "next step", "increase sales", "budget", "recommend",
+    ),
+}
+
+# One combined automaton instead of a pattern per intent: each keyword
+# sits in a named group for its category, so a single finditer pass tallies
+# every bucket at once rather than rescanning the message four times.
+_INTENT_SCAN_RE = re.compile(
+    "|".join(
+        f"(?P<{intent}>" + r"\b(?:" + "|".join(map(re.escape, keywords)) + "))"
+        for intent, keywords in _INTENT_KEYWORDS.items()
+    )
+)
+
+_GREETINGS = frozenset({
+    'hi', 'hello', 'hey', 'yo', 'sup', 'hola', 'howdy', 'thanks', 'thank you',
+})
+
+
+def _fast_classify(user_message: str) -> Optional[IntentClassification]:
     """
-    Classify user intent using fast model.
-    
-    Uses small model (llama-3.1-8b-instant) for speed and cost efficiency.
+    Classify unambiguous messages with compiled keyword patterns.
+
+    Returns None when no category wins outright, so ambiguous questions
+    still get the LLM.
     """
-    model, config = get_model_for_task("routing")
-    model = model.with_structured_output(IntentClassification)
-    
+    msg = user_message.strip().lower()
+
+    if msg.rstrip("!. ") in _GREETINGS:
+        return IntentClassification(intent="general", confidence=0.95)
+
+    counts = Counter(m.lastgroup for m in _INTENT_SCAN_RE.finditer(msg))
+    if not counts:
+        return None
+
+    ranked = counts.most_common(2)
+    best_intent, best = ranked[0]
+    # Require a clear winner — ties go to the LLM
+    if len(ranked) > 1 and ranked[1][1] == best:
+        return None
+
+    return IntentClassification(
+        intent=best_intent,
+        confidence=min(0.9, 0.65 + 0.1 * best),
+    )
+
+
+# Classification cache: many messages repeat verbatim across turns and
+# users ("hi", "how's my business"), so hot prompts skip the LLM entirely.
+# TTL'd so prompt or model changes eventually age out; in-flight tasks are
+# shared ("single-flight") so concurrent identical messages pay for one call.
+_INTENT_CACHE_TTL = 3600
+_INTENT_CACHE_MAX = 4096
+_intent_cache: dict[str, tuple[float, IntentClassification]] = {}
+_inflight: dict[str, asyncio.Task] = {}
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _intent_cache_key(user_message: str) -> str:
+    return _WHITESPACE_RE.sub(" ", user_message.strip().lower())[:200]
+
+
+async def _classify_intent_uncached(user_message: str) -> IntentClassification:
+    model = _get_structured_router()
+
     messages = [
-        SystemMessage(content=INTENT_CLASSIFICATION_PROMPT),
+        _SYS_MSG,
         HumanMessage(content=f"User message: {user_message}")
     ]
-    
+
     result = await model.ainvoke(messages)
     return result
 
 
+async def classify_intent(user_message: str) -> IntentClassification:
+    """
+    Classify user intent using fast model.
+
+    Uses small model (llama-3.1-8b-instant) for speed and cost efficiency.
+    Results are cached in-process by normalized message, and concurrent
+    requests for the same message share a single LLM call.
+    """
+    key = _intent_cache_key(user_message)
+
+    cached = _intent_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < _INTENT_CACHE_TTL:
+        return cached[1]
+
+    # Local keyword tier — no LLM, no cache entry needed (recomputing is free)
+    fast = _fast_classify(user_message)
+    if fast is not None:
+        return fast
+
+    task = _inflight.get(key)
+    if task is not None:
+        return await task
+
+    task = asyncio.ensure_future(_classify_intent_uncached(user_message))
+    _inflight[key] = task
+    try:
+        result = await task
+    finally:
+        _inflight.pop(key, None)
+
+    if len(_intent_cache) > _INTENT_CACHE_MAX:
+        _intent_cache.clear()
+    _intent_cache[key] = (time.monotonic(), result)
+    return result
+
+
 # Intent to agent mapping
 INTENT_AGENT_MAP = {
     "analytics": "analytics_agent",
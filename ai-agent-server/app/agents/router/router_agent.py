@@ -9,6 +9,7 @@ Central orchestration agent that:
 """
 
 import logging
+import re
 from typing import Literal
 
 from langgraph.graph import StateGraph, END
@@ -154,7 +155,7 @@ async def route_to_general(state: AgentState) -> AgentState:
         state["output"] = AgentOutput.text_response(
             summary=GENERAL_RESPONSE_TEMPLATE,
             confidence=0.95
-        ).model_dump()
+        ).dump()
         return state
     
     # For actual questions, use LLM to generate a helpful response
@@ -181,13 +182,13 @@ async def route_to_general(state: AgentState) -> AgentState:
         state["output"] = AgentOutput.text_response(
             summary=response_text,
             confidence=0.9
-        ).model_dump()
+        ).dump()
     except Exception as e:
         logger.warning(f"General LLM response failed, using template: {e}")
         state["output"] = AgentOutput.text_response(
             summary=GENERAL_RESPONSE_TEMPLATE,
             confidence=0.95
-        ).model_dump()
+        ).dump()
     
     return state
 
@@ -261,8 +262,27 @@ def get_router_graph():
     return _router_graph
 
 
+# Pure greetings resolve to a canned intro — no routing, budget, or agent
+# LLM call is worth paying for them
+_GREETING_RE = re.compile(r"^\s*(?:hi|hello|hey|yo|sup|hola|howdy)[\s!.?]*$", re.IGNORECASE)
+
+
 async def execute_router(state: AgentState) -> AgentState:
     """Execute the full router pipeline."""
+    if _GREETING_RE.match(state["input"]):
+        from app.agents.prompts import GENERAL_RESPONSE_TEMPLATE
+
+        stream_callback = getattr(state["context"], "stream_callback", None)
+        if stream_callback:
+            await stream_callback(GENERAL_RESPONSE_TEMPLATE)
+        state["intent"] = "general"
+        state["agent"] = "general_agent"
+        state["output"] = AgentOutput.text_response(
+            summary=GENERAL_RESPONSE_TEMPLATE,
+            confidence=0.95
+        ).dump()
+        return state
+
     graph = get_router_graph()
     result = await graph.ainvoke(state)
     return result
@@ -5,10 +5,12 @@ Production WebSocket handler for real-time AI chat.
 Supports token-by-token streaming, rate limiting, cancellation, and error propagation.
 """
 
+import asyncio
 import logging
-import json
 import uuid
 import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
 from typing import Optional
 from enum import Enum
 
@@ -17,8 +19,9 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.auth import authenticate_websocket, AuthContext
 from app.agents import execute_router, AgentState, ExecutionContext
 from app.agents.base import create_initial_state
-from app.memory import RedisMemoryStore
+from app.memory import ChatSessionStore, RedisMemoryStore
 from app.config import get_settings
+from app.serialization import json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -39,67 +42,169 @@ class MessageType(str, Enum):
     CONNECTED = "connected"
 
 
+@dataclass(slots=True)
+class _ConnState:
+    """Per-connection state, consolidated so hot paths do one dict lookup."""
+    websocket: WebSocket
+    send_queue: asyncio.Queue
+    sender_task: asyncio.Task
+    cancelled: bool = False
+    # Persistence writes in flight, drained on disconnect
+    bg_tasks: set = field(default_factory=set)
+
+
 class ConnectionManager:
     """Manages active WebSocket connections with rate limiting."""
-    
+
+    # Outbound frames buffered per connection before a slow consumer
+    # starts costing us dropped frames
+    SEND_QUEUE_SIZE = 512
+
+    # Sliding rate-limit window, and how often stale per-user entries
+    # (quiet for well over a window) are swept out
+    RATE_WINDOW_SECONDS = 60.0
+    RATE_SWEEP_SECONDS = 300.0
+
     def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
-        self.cancelled: set[str] = set()
-        # Rate limiting: user_id -> list of timestamps
-        self._rate_limits: dict[str, list[float]] = {}
-    
+        self._conns: dict[str, _ConnState] = {}
+        # Rate limiting: user_id -> deque of request timestamps (oldest first)
+        self._rate_limits: defaultdict[str, deque[float]] = defaultdict(deque)
+        self._rate_sweeper: Optional[asyncio.Task] = None
+        # Sessions whose auto-title has already been attempted; skipping the
+        # conditional write after turn 1 is safe because the write itself
+        # only matches single-message sessions
+        self.titled_sessions: set[str] = set()
+
     async def connect(self, connection_id: str, websocket: WebSocket) -> None:
-        """Accept and register connection."""
+        """Accept and register connection, starting its sender task."""
         await websocket.accept()
-        self.active_connections[connection_id] = websocket
-    
+        # Lazily started here because __init__ runs at import time, before
+        # an event loop exists
+        if self._rate_sweeper is None or self._rate_sweeper.done():
+            self._rate_sweeper = asyncio.create_task(self._sweep_rate_limits())
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+        self._conns[connection_id] = _ConnState(
+            websocket=websocket,
+            send_queue=queue,
+            sender_task=asyncio.create_task(self._sender(websocket, queue)),
+        )
+
     def disconnect(self, connection_id: str) -> None:
-        """Remove connection."""
-        self.active_connections.pop(connection_id, None)
-        self.cancelled.discard(connection_id)
-    
-    async def send_json(self, connection_id: str, data: dict) -> None:
-        """Send JSON message."""
-        if ws := self.active_connections.get(connection_id):
-            await ws.send_json(data)
-    
+        """Remove connection and wind down its sender task."""
+        conn = self._conns.pop(connection_id, None)
+        if conn is None:
+            return
+        try:
+            # Sentinel after any queued frames: sender flushes, then exits
+            conn.send_queue.put_nowait(None)
+        except asyncio.QueueFull:
+            conn.sender_task.cancel()
+
+    @staticmethod
+    async def _sender(websocket: WebSocket, queue: asyncio.Queue) -> None:
+        """Drain a connection's queue onto the socket, one frame per item."""
+        try:
+            while True:
+                data = await queue.get()
+                if data is None:
+                    return
+                if isinstance(data, str):
+                    # Already serialized (pre-built stream frames)
+                    await websocket.send_text(data)
+                else:
+                    await websocket.send_text(json_dumps(data))
+        except Exception as e:
+            # Socket went away mid-send; the receive loop handles teardown
+            logger.debug(f"Sender task stopped: {e}")
+
+    async def send_json(self, connection_id: str, data) -> None:
+        """Queue a message (dict, or an already-serialized JSON string)."""
+        conn = self._conns.get(connection_id)
+        if conn is None:
+            return
+        try:
+            conn.send_queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Consumer can't keep up — drop the oldest frame rather than
+            # block the agent pipeline behind a slow client
+            try:
+                conn.send_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            conn.send_queue.put_nowait(data)
+
+    def spawn(self, connection_id: str, coro) -> asyncio.Task:
+        """Run a persistence coroutine without blocking the response path."""
+        task = asyncio.create_task(coro)
+        conn = self._conns.get(connection_id)
+        if conn is not None:
+            conn.bg_tasks.add(task)
+            task.add_done_callback(conn.bg_tasks.discard)
+        return task
+
+    async def drain_tasks(self, connection_id: str, timeout: float = 2.0) -> None:
+        """Best-effort wait for a connection's in-flight persistence writes."""
+        conn = self._conns.get(connection_id)
+        if conn is not None and conn.bg_tasks:
+            await asyncio.wait(conn.bg_tasks, timeout=timeout)
+
     def cancel(self, connection_id: str) -> None:
         """Mark connection as cancelled."""
-        self.cancelled.add(connection_id)
-    
+        if conn := self._conns.get(connection_id):
+            conn.cancelled = True
+
     def is_cancelled(self, connection_id: str) -> bool:
         """Check if connection is cancelled."""
-        return connection_id in self.cancelled
-    
+        conn = self._conns.get(connection_id)
+        return conn is not None and conn.cancelled
+
     def check_rate_limit(self, user_id: str) -> bool:
         """
         Check if user is within rate limit.
         
-        Uses a sliding window of timestamps.
+        Uses a sliding window of monotonic timestamps — immune to wall-clock
+        (NTP) jumps that could reset or inflate the window.
         Returns True if request is allowed, False if rate limited.
         """
-        now = time.time()
-        window = 60.0  # 1 minute window
+        now = time.monotonic()
         max_requests = settings.ws_rate_limit_per_minute
-        
-        if user_id not in self._rate_limits:
-            self._rate_limits[user_id] = []
-        
-        # Remove timestamps outside the window
-        self._rate_limits[user_id] = [
-            ts for ts in self._rate_limits[user_id] 
-            if now - ts < window
-        ]
-        
-        if len(self._rate_limits[user_id]) >= max_requests:
+
+        dq = self._rate_limits[user_id]
+
+        # Evict expired timestamps from the front — O(evicted), no rebuild
+        while dq and now - dq[0] >= self.RATE_WINDOW_SECONDS:
+            dq.popleft()
+
+        if len(dq) >= max_requests:
             return False
-        
-        self._rate_limits[user_id].append(now)
+
+        dq.append(now)
         return True
 
+    async def _sweep_rate_limits(self) -> None:
+        """Periodically drop rate-limit entries for users gone quiet.
+
+        Keeps the table bounded on long-running servers instead of growing
+        with every user_id ever seen.
+        """
+        while True:
+            await asyncio.sleep(self.RATE_SWEEP_SECONDS)
+            cutoff = time.monotonic() - 2 * self.RATE_WINDOW_SECONDS
+            stale = [
+                uid for uid, dq in self._rate_limits.items()
+                if not dq or dq[-1] < cutoff
+            ]
+            for uid in stale:
+                del self._rate_limits[uid]
+
 
 manager = ConnectionManager()
 
+# Minimum spacing between stream frames: deltas arriving faster than this
+# are concatenated into one frame, cutting serialization and TCP writes
+# without visibly changing the typing effect
+_STREAM_FRAME_INTERVAL = 0.015
+
 
 @router.websocket("/chat")
 async def websocket_chat(websocket: WebSocket):
@@ -131,7 +236,6 @@ async def websocket_chat(websocket: WebSocket):
         session_id = websocket.query_params.get("session_id")
         
         # Create or validate session
-        from app.memory import ChatSessionStore
         session_store = ChatSessionStore(org_id=auth.org_id, user_id=auth.user_id)
         
         if session_id:
@@ -143,7 +247,12 @@ async def websocket_chat(websocket: WebSocket):
         else:
             # Create new session
             session_id = await session_store.create_session()
-        
+
+        # Session ids already validated (or created) on this connection —
+        # switching back to one of these skips the Mongo existence check.
+        # Per-connection on purpose: validation is scoped to this user's auth.
+        validated_sessions = {session_id}
+
         # Register connection
         await manager.connect(connection_id, websocket)
         
@@ -159,16 +268,20 @@ async def websocket_chat(websocket: WebSocket):
         
         # Message loop
         while True:
-            data = await websocket.receive_json()
+            data = json_loads(await websocket.receive_text())
             msg_type = data.get("type")
             
             # Allow client to switch session mid-connection
             incoming_session_id = data.get("session_id")
             if incoming_session_id and incoming_session_id != session_id:
-                # Validate and switch
-                existing = await session_store.get_session(incoming_session_id)
-                if existing:
+                if incoming_session_id in validated_sessions:
                     session_id = incoming_session_id
+                else:
+                    # First time this id is seen on the connection — validate
+                    existing = await session_store.get_session(incoming_session_id)
+                    if existing:
+                        session_id = incoming_session_id
+                        validated_sessions.add(incoming_session_id)
             
             # Handle ping for keepalive
             if msg_type == "ping":
@@ -207,6 +320,7 @@ async def websocket_chat(websocket: WebSocket):
                     session_id=session_id,
                     auth=auth,
                     content=content,
+                    session_store=session_store,
                 )
     
     except WebSocketDisconnect:
@@ -221,6 +335,10 @@ async def websocket_chat(websocket: WebSocket):
         except:
             pass
     finally:
+        try:
+            await manager.drain_tasks(connection_id)
+        except Exception:
+            pass
         manager.disconnect(connection_id)
 
 
@@ -229,39 +347,69 @@ async def process_message(
     session_id: str,
     auth: AuthContext,
     content: str,
+    session_store: ChatSessionStore,
 ) -> None:
     """Process a chat message through the agent pipeline with streaming."""
     message_id = str(uuid.uuid4())
-    
-    # Initialize session store for persistence
-    from app.memory import ChatSessionStore
-    session_store = ChatSessionStore(org_id=auth.org_id, user_id=auth.user_id)
-    
+
     try:
         # Check for cancellation
         if manager.is_cancelled(connection_id):
             return
         
-        # Store user message in MongoDB
-        await session_store.add_message(session_id, "user", content)
-        
-        # Auto-generate title from first message
-        session = await session_store.get_session(session_id)
-        if session and len(session.get("messages", [])) == 1:
-            # First message - generate title
-            title = content[:50] + ("..." if len(content) > 50 else "")
-            await session_store.update_title(session_id, title)
-        
-        # Create stream callback for token-by-token streaming
+        # Persist the user message off the response path — the client doesn't
+        # need the Mongo write to land before tokens start streaming. Title
+        # generation is chained behind the write so the message count it
+        # reads is consistent.
+        async def _persist_user_message() -> None:
+            await session_store.add_message(session_id, "user", content)
+            # Auto-generate title from first message: one conditional write
+            # instead of reading the session back to count messages
+            if session_id not in manager.titled_sessions:
+                if len(manager.titled_sessions) > 4096:
+                    manager.titled_sessions.clear()
+                manager.titled_sessions.add(session_id)
+                title = content[:50] + ("..." if len(content) > 50 else "")
+                await session_store.set_title_if_first(session_id, title)
+
+        user_write = manager.spawn(connection_id, _persist_user_message())
+
+        # Stream callback buffers deltas; the flush loop below coalesces
+        # them so each WebSocket frame carries everything that arrived since
+        # the last one instead of a frame per delta
+        pending_deltas: list[str] = []
+        wakeup = asyncio.Event()
+        streaming_done = False
+
+        # The stream envelope is constant per message — serialize it once
+        # and splice each delta in, instead of rebuilding dict + full dump
+        # for every frame
+        stream_prefix = json_dumps({
+            "type": MessageType.STREAM.value,
+            "message_id": message_id,
+        })[:-1] + ',"delta":'
+
         async def stream_callback(delta: str) -> None:
-            """Send each token chunk to the client via WebSocket."""
+            """Queue a token chunk for the next stream frame."""
             if not manager.is_cancelled(connection_id):
-                await manager.send_json(connection_id, {
-                    "type": MessageType.STREAM,
-                    "delta": delta,
-                    "message_id": message_id,
-                })
-        
+                pending_deltas.append(delta)
+                wakeup.set()
+
+        async def _flush_stream() -> None:
+            while True:
+                await wakeup.wait()
+                wakeup.clear()
+                while pending_deltas:
+                    delta = "".join(pending_deltas)
+                    pending_deltas.clear()
+                    await manager.send_json(
+                        connection_id, stream_prefix + json_dumps(delta) + "}"
+                    )
+                    await asyncio.sleep(_STREAM_FRAME_INTERVAL)
+                if streaming_done:
+                    return
+
+
         # Create execution context with stream callback
         context = ExecutionContext(
             auth=auth,
@@ -282,9 +430,15 @@ async def process_message(
             "status": "classifying intent"
         })
         
-        # Execute router
-        result = await execute_router(state)
-        
+        # Execute router (flush loop runs alongside, draining stream deltas)
+        flush_task = asyncio.create_task(_flush_stream())
+        try:
+            result = await execute_router(state)
+        finally:
+            streaming_done = True
+            wakeup.set()
+            await flush_task
+
         # Check for cancellation
         if manager.is_cancelled(connection_id):
             return
@@ -300,15 +454,26 @@ async def process_message(
         # Get output
         output = result.get("output", {})
         
-        # Store assistant message in MongoDB
-        await session_store.add_message(
-            session_id, 
-            "assistant", 
-            output.get("summary", ""),
-            agent_output=output
-        )
-        
-        # Send complete response (always sent, even after streaming)
+        # Persist the assistant message off the response path too — chained
+        # behind the user write so the stored conversation keeps its order
+        # and first-message titling still sees exactly one message
+        async def _persist_assistant_message() -> None:
+            try:
+                await user_write
+            except Exception:
+                pass  # user write logs its own failures; still persist ours
+            await session_store.add_message(
+                session_id,
+                "assistant",
+                output.get("summary", ""),
+                agent_output=output
+            )
+
+        manager.spawn(connection_id, _persist_assistant_message())
+
+        # Send complete response (always sent, even after streaming —
+        # the client clears its stream buffer and renders output.summary,
+        # and summary may carry sections that were never streamed)
         await manager.send_json(connection_id, {
             "type": MessageType.COMPLETE,
             "message_id": message_id,
@@ -317,7 +482,11 @@ async def process_message(
         })
         
         logger.info(f"Message processed: {message_id}, session={session_id}")
-    
+
+        # Drain bookkeeping tasks (usage recording, execution logs) after the
+        # response has been sent so they never gate perceived latency
+        await context.drain_background_tasks()
+
     except Exception as e:
         logger.exception(f"Error processing message: {message_id}")
         await manager.send_json(connection_id, {
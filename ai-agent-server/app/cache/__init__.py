@@ -0,0 +1,4 @@
+# Cache module
+from .analysis import get_cached_analysis, store_analysis, tool_fingerprint
+
+__all__ = ["get_cached_analysis", "store_analysis", "tool_fingerprint"]
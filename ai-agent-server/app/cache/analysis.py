@@ -0,0 +1,58 @@
+"""
+Analysis Response Cache
+
+Redis-backed cache for the final analysis LLM call — the dominant cost
+of a request. Dashboard users repeat the same questions, so an exact
+match on the normalized question is a frequent hit.
+
+Keys include a fingerprint of the serialized tool results, so a cached
+summary is only served while the underlying data is unchanged: when
+stock or order numbers move, the fingerprint moves and the entry is
+simply never read again. TTL bounds memory either way.
+"""
+
+import hashlib
+import logging
+
+from app.memory.redis_memory import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Half an hour: long enough to absorb repeated dashboard queries, short
+# enough that orphaned entries (dead fingerprints) don't accumulate
+ANALYSIS_CACHE_TTL = 1800
+
+
+def _cache_key(user_input: str, tool_fingerprint: str) -> str:
+    question_hash = hashlib.sha1(
+        user_input.lower().strip().encode("utf-8")
+    ).hexdigest()
+    return f"analysis:{tool_fingerprint}:{question_hash}"
+
+
+def tool_fingerprint(tool_context: str) -> str:
+    """Fingerprint the serialized tool results for cache keying."""
+    return hashlib.sha1(tool_context.encode("utf-8")).hexdigest()[:16]
+
+
+async def get_cached_analysis(user_input: str, fingerprint: str) -> str | None:
+    """Look up a cached analysis for this question + data snapshot."""
+    try:
+        redis_client = await get_redis_client()
+        return await redis_client.get(_cache_key(user_input, fingerprint))
+    except Exception as e:
+        logger.debug(f"Analysis cache read failed: {e}")
+        return None
+
+
+async def store_analysis(user_input: str, fingerprint: str, response_text: str) -> None:
+    """Store an analysis response for reuse while the data is unchanged."""
+    try:
+        redis_client = await get_redis_client()
+        await redis_client.setex(
+            _cache_key(user_input, fingerprint),
+            ANALYSIS_CACHE_TTL,
+            response_text,
+        )
+    except Exception as e:
+        logger.debug(f"Analysis cache write failed: {e}")
@@ -2,8 +2,11 @@
 from .factory import (
     create_model,
     create_streaming_model,
+    get_cached_model,
+    get_cached_model_for_task,
     get_default_model,
     get_model_for_task,
+    warmup,
     TokenTrackingCallback,
     StreamingTokenCounter,
     ModelConfig,
@@ -13,8 +16,11 @@ from .factory import (
 __all__ = [
     "create_model",
     "create_streaming_model",
+    "get_cached_model",
+    "get_cached_model_for_task",
     "get_default_model",
     "get_model_for_task",
+    "warmup",
     "TokenTrackingCallback",
     "StreamingTokenCounter",
     "ModelConfig",
@@ -5,11 +5,13 @@ Creates LangChain chat models for different providers with token tracking callba
 Supports both synchronous invocation and async streaming.
 """
 
+import asyncio
 import logging
 from typing import Optional, AsyncIterator
 from dataclasses import dataclass
 
 from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import HumanMessage
 from langchain_core.outputs import LLMResult
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_groq import ChatGroq
@@ -181,6 +183,67 @@ def create_streaming_model(
     )
 
 
+# Shared base clients keyed by (provider, model, streaming). Construction is
+# non-trivial (HTTP client setup), so build once per process and attach
+# per-call callbacks via model.with_config(callbacks=[...]).
+_MODEL_CACHE: dict[tuple[str, str, bool], BaseChatModel] = {}
+
+
+def get_cached_model(
+    provider: str,
+    model: str,
+    streaming: bool = False,
+    max_tokens: int = 4096,
+) -> BaseChatModel:
+    """
+    Get a shared chat model client for (provider, model).
+
+    The returned instance has no callbacks attached — bind per-call callbacks
+    with `model.with_config(callbacks=[...])` so the underlying HTTP pool is reused.
+    """
+    key = (provider, model, streaming)
+    cached = _MODEL_CACHE.get(key)
+    if cached is None:
+        cached = _create_provider_model(
+            provider=provider,
+            model=model,
+            callbacks=[],
+            temperature=0.1,
+            max_tokens=max_tokens,
+            streaming=streaming,
+        )
+        _MODEL_CACHE[key] = cached
+    return cached
+
+
+_TASK_MODEL_CACHE: dict[str, tuple[BaseChatModel, "ModelConfig"]] = {}
+
+
+def get_cached_model_for_task(task_type: str) -> tuple[BaseChatModel, "ModelConfig"]:
+    """
+    Get the recommended model for a task, constructing it once per process.
+
+    For callback-free call sites (tool selection, parameter extraction)
+    this skips per-request client construction and keeps the underlying
+    HTTP connection pool warm. Bind per-request callbacks with
+    `model.with_config(callbacks=[...])` if needed.
+    """
+    cached = _TASK_MODEL_CACHE.get(task_type)
+    if cached is None:
+        config = MODEL_RECOMMENDATIONS.get(task_type, MODEL_RECOMMENDATIONS["analytics"])
+        model = _create_provider_model(
+            provider=config.provider,
+            model=config.model,
+            callbacks=[],
+            temperature=0.1,
+            max_tokens=config.max_tokens,
+            streaming=False,
+        )
+        cached = (model, config)
+        _TASK_MODEL_CACHE[task_type] = cached
+    return cached
+
+
 def get_default_model(callbacks: Optional[list] = None) -> BaseChatModel:
     """Get the default model based on settings."""
     return create_model(
@@ -220,3 +283,28 @@ def get_model_for_task(
     )
     
     return model, config
+
+
+async def warmup() -> None:
+    """
+    Construct and warm the hot-path model clients at startup.
+
+    Builds the cached routing and tool-selection clients plus the default
+    agent model so no request pays client construction, then issues one
+    tiny routing call to establish the HTTP pool and TLS session. The ping
+    is best-effort — a failure (missing key, offline environment) only
+    means the first real request warms the connection instead.
+    """
+    routing_model, _ = get_cached_model_for_task("routing")
+    get_cached_model_for_task("tool_selection")
+    get_cached_model(settings.default_provider, settings.default_model)
+    get_cached_model(settings.default_provider, settings.default_model, streaming=True)
+
+    try:
+        await asyncio.wait_for(
+            routing_model.ainvoke([HumanMessage(content="ping")]),
+            timeout=5.0,
+        )
+        logger.info("Model warmup complete")
+    except Exception as e:
+        logger.debug(f"Model warmup ping skipped: {e}")
@@ -37,6 +37,11 @@ async def lifespan(app: FastAPI):
     # Pre-connect to RabbitMQ
     await get_rabbitmq_connection()
 
+    # Warm the hot-path model clients so the first message of a cold
+    # worker doesn't pay client construction and TLS setup
+    from app.llms import warmup as warmup_models
+    await warmup_models()
+
     logger.info("All services connected")
 
     yield
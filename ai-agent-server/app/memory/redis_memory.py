@@ -20,16 +20,31 @@ settings = get_settings()
 
 _redis_client: Optional[redis.Redis] = None
 
+# Stores a pending action and appends both history messages atomically in
+# one round-trip. KEYS: pending_action_key, messages_key. ARGV: action
+# payload, action TTL, user message, assistant message, history TTL.
+_COMMIT_PENDING_LUA = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[2]))
+redis.call('RPUSH', KEYS[2], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[5]))
+return 1
+"""
+_commit_pending_script = None
+
 
 async def get_redis_client() -> redis.Redis:
     """Get or create Redis client."""
     global _redis_client
     if _redis_client is None:
-        _redis_client = redis.from_url(
+        # Blocking pool: under concurrency, waiters queue for a connection
+        # instead of erroring out or opening unbounded sockets
+        pool = redis.BlockingConnectionPool.from_url(
             settings.redis_url,
+            max_connections=50,
             encoding="utf-8",
             decode_responses=True
         )
+        _redis_client = redis.Redis(connection_pool=pool)
     return _redis_client
 
 
@@ -87,7 +102,27 @@ class RedisMemoryStore:
         pipe.rpush(self.messages_key, message_json)
         pipe.expire(self.messages_key, settings.memory_ttl_seconds)
         await pipe.execute()
-    
+
+    async def add_messages(self, messages: list[tuple[str, str]]) -> None:
+        """
+        Add multiple messages in a single Redis round-trip.
+
+        Args:
+            messages: List of (role, content) tuples, in conversation order
+        """
+        redis_client = await get_redis_client()
+
+        pipe = redis_client.pipeline()
+        for role, content in messages:
+            message = ConversationMessage(role=role, content=content)
+            pipe.rpush(self.messages_key, json.dumps({
+                "role": message.role,
+                "content": message.content,
+                "timestamp": message.timestamp
+            }))
+        pipe.expire(self.messages_key, settings.memory_ttl_seconds)
+        await pipe.execute()
+
     async def get_messages(self, limit: int = 20) -> list[ConversationMessage]:
         """Get recent messages from history."""
         redis_client = await get_redis_client()
@@ -183,6 +218,62 @@ class RedisMemoryStore:
         # Store with 10 minute expiry (user should confirm within this time)
         await redis_client.set(self.pending_action_key, action_data, ex=600)
     
+    async def commit_pending(
+        self,
+        action_type: str,
+        params: dict,
+        preview_data: dict,
+        user_msg: str,
+        assistant_msg: str,
+    ) -> None:
+        """
+        Store a pending action and both history messages atomically.
+
+        Collapses the set_pending_action + two add_message round-trips of
+        the action-preview path into a single EVALSHA (loaded once per
+        process, re-registered transparently on script-cache flush).
+        """
+        global _commit_pending_script
+        redis_client = await get_redis_client()
+        if _commit_pending_script is None:
+            _commit_pending_script = redis_client.register_script(_COMMIT_PENDING_LUA)
+
+        action_data = json.dumps({
+            "action_type": action_type,
+            "params": params,
+            "preview_data": preview_data,
+            "created_at": datetime.utcnow().isoformat()
+        })
+        history = [
+            json.dumps({
+                "role": role,
+                "content": content,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            for role, content in (("user", user_msg), ("assistant", assistant_msg))
+        ]
+
+        await _commit_pending_script(
+            keys=[self.pending_action_key, self.messages_key],
+            args=[action_data, 600, history[0], history[1], settings.memory_ttl_seconds],
+        )
+
+    async def clear_pending_with_history(self, messages: list[tuple[str, str]]) -> None:
+        """Clear the pending action and append history in one round-trip."""
+        redis_client = await get_redis_client()
+
+        pipe = redis_client.pipeline()
+        pipe.delete(self.pending_action_key)
+        for role, content in messages:
+            message = ConversationMessage(role=role, content=content)
+            pipe.rpush(self.messages_key, json.dumps({
+                "role": message.role,
+                "content": message.content,
+                "timestamp": message.timestamp
+            }))
+        pipe.expire(self.messages_key, settings.memory_ttl_seconds)
+        await pipe.execute()
+
     async def get_pending_action(self) -> Optional[dict]:
         """
         Get pending action if exists.
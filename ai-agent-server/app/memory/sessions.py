@@ -207,6 +207,30 @@ class ChatSessionStore:
             logger.error(f"Error adding message to session {session_id}: {e}")
             return False
     
+    async def set_title_if_first(self, session_id: str, title: str) -> bool:
+        """
+        Set the session title only if it holds exactly one message.
+
+        Single conditional write — replaces the read-back previously used
+        to detect a session's first message.
+        """
+        collection = await self._get_collection()
+
+        try:
+            result = await collection.update_one(
+                {
+                    "_id": ObjectId(session_id),
+                    "org_id": self.org_id,
+                    "user_id": self.user_id,
+                    "messages": {"$size": 1},
+                },
+                {"$set": {"title": title}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error setting session title {session_id}: {e}")
+            return False
+
     async def update_title(self, session_id: str, title: str) -> bool:
         """Update session title."""
         collection = await self._get_collection()
@@ -0,0 +1,30 @@
+"""
+JSON Serialization Helpers
+
+Shared JSON codec for hot paths (tool-result serialization, LLM-response
+parsing). Prefers orjson — a C-extension codec that is several times faster
+than stdlib json on nested dict/list payloads — and falls back to stdlib
+json if orjson isn't installed.
+"""
+
+import json
+from typing import Any, Callable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is a regular dependency
+    orjson = None
+
+
+def json_dumps(data: Any, default: Callable[[Any], Any] = str) -> str:
+    """Serialize to a compact JSON string."""
+    if orjson is not None:
+        return orjson.dumps(data, default=default).decode()
+    return json.dumps(data, default=default, separators=(",", ":"))
+
+
+def json_loads(text: str | bytes) -> Any:
+    """Parse a JSON string or bytes."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)